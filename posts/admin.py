@@ -1,13 +1,45 @@
 from django.contrib import admin
 from .models import Post, Group, Comment, Follow
+from .paginator import EstimatedCountPaginator
+from . import search
 
 
-class PostAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Общие настройки списков больших таблиц: оценка числа строк вместо
+    COUNT(*), без второго подсчёта всей таблицы, и только нужные списку
+    колонки (changelist_only) — форма редактирования читает запись
+    целиком.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    changelist_only = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = request.resolver_match
+        if (self.changelist_only and match is not None
+                and match.url_name.endswith('_changelist')):
+            queryset = queryset.only(*self.changelist_only)
+        return queryset
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
+    changelist_only = ('text', 'pub_date', 'author', 'author__username',
+                       'group', 'group__title')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE '%q%'.
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug', 'description')
@@ -15,14 +47,40 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentsAdmin(admin.ModelAdmin):
+class CommentsAdmin(LargeTableAdmin):
     list_display = ('text', 'post', 'author', 'created')
+    list_select_related = ('post', 'author')
+    changelist_only = ('text', 'created', 'post', 'post__text', 'author',
+                       'author__username')
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
     search_fields = ('text',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Текст ищется как раньше, а имя автора — точным совпадением по
+        # уникальному индексу username, без LIKE по таблице
+        # пользователей.
+        results, duplicates = super().get_search_results(
+            request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(author__username=search_term)
+        return results, duplicates
+
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    changelist_only = ('user', 'user__username', 'author',
+                       'author__username')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return (queryset.filter(user__username=search_term)
+                | queryset.filter(author__username=search_term)), False
 
 
 admin.site.register(Post, PostAdmin)
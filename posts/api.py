@@ -0,0 +1,162 @@
+"""
+JSON API только для чтения для мобильного клиента.
+
+Списки используют те же запросы, что и HTML-страницы (for_feed,
+follow_feed, CursorPaginator). ETag и Last-Modified считаются по
+версиям областей кэша (posts/conditional.py), поэтому ответ 304
+отдаётся до запросов к ленте и сериализации.
+"""
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from .conditional import conditional
+from .feed import FEED_ORDERING, follow_feed
+from .models import Group, Post, User
+from .paginator import CursorPaginator
+from .routers import read_replica
+
+# Меняется вместе с форматом ответа, чтобы старые ETag не совпали.
+API_VERSION = 2
+PAGE_SIZE = 20
+JSON_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=JSON_PARAMS)
+
+
+def api_view(get_scopes):
+    """GET-представление API с ETag/Last-Modified, читает с реплики"""
+    def decorator(view):
+        return read_replica(require_GET(conditional(
+            get_scopes, salt=f'api{API_VERSION}')(view)))
+    return decorator
+
+
+def serialize_post(post):
+    return {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'thumbnail': post.thumbnail_url or None,
+        'comment_count': post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def cursor_links(path, page):
+    links = {}
+    for name, cursor in (('next', page.next_cursor),
+                         ('previous', page.previous_cursor)):
+        links[name] = f'{path}?cursor={cursor}' if cursor else None
+    return links
+
+
+def cursor_list(request, queryset):
+    paginator = CursorPaginator(queryset, PAGE_SIZE)
+    page = paginator.cursor_page(request.GET.get('cursor'))
+    return json_response({'results': [serialize_post(post)
+                                      for post in page.object_list],
+                          **cursor_links(request.path, page)})
+
+
+def feed_scopes(request):
+    return ('posts', 'groups')
+
+
+def group_scopes(request, slug):
+    request.group = get_object_or_404(Group, slug=slug)
+    return (f'group:{request.group.pk}', 'groups')
+
+
+def author_scopes(request, username, **kwargs):
+    request.author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    return (f'author:{request.author.pk}', f'profile:{request.author.pk}',
+            'groups')
+
+
+def follow_scopes(request):
+    return ('posts', 'groups', f'follow:{request.user.pk}')
+
+
+@api_view(feed_scopes)
+def post_list(request):
+    return cursor_list(request, Post.objects.for_feed())
+
+
+@api_view(group_scopes)
+def group_feed(request, slug):
+    return cursor_list(request, request.group.posts.for_feed())
+
+
+@api_view(author_scopes)
+def profile(request, username):
+    author = request.author
+    return json_response({
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'post_count': author.profile.post_count,
+        'follower_count': author.profile.follower_count,
+        'following_count': author.profile.following_count,
+        'posts': f'{request.path}posts/',
+    })
+
+
+@api_view(author_scopes)
+def profile_posts(request, username):
+    return cursor_list(request,
+                       Post.objects.for_feed().filter(author=request.author))
+
+
+@api_view(author_scopes)
+def post_detail(request, username, post_id):
+    """Пост с первой страницей комментариев, остальные — по comments_next"""
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id,
+                             author=request.author)
+    page = post.comment_paginator(PAGE_SIZE).cursor_page()
+    links = cursor_links(reverse('api:post_comments',
+                                 args=[username, post_id]), page)
+    return json_response({**serialize_post(post),
+                          'comments': [serialize_comment(comment)
+                                       for comment in page.object_list],
+                          'comments_next': links['next']})
+
+
+@api_view(author_scopes)
+def post_comments(request, username, post_id):
+    post = get_object_or_404(Post, id=post_id, author=request.author)
+    page = post.comment_paginator(PAGE_SIZE).cursor_page(
+        request.GET.get('cursor'))
+    return json_response({'results': [serialize_comment(comment)
+                                      for comment in page.object_list],
+                          **cursor_links(request.path, page)})
+
+
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return json_response({'detail': 'Требуется вход'}, status=403)
+    return follow_page(request)
+
+
+@api_view(follow_scopes)
+def follow_page(request):
+    paginator = CursorPaginator(follow_feed(request.user, keyed=True),
+                                PAGE_SIZE, ordering=FEED_ORDERING)
+    page = paginator.cursor_page(request.GET.get('cursor'))
+    return json_response({'results': [serialize_post(post)
+                                      for post in page.object_list],
+                          **cursor_links(request.path, page)})
@@ -0,0 +1,15 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', api.post_list, name='posts'),
+    path('follow/', api.follow_index, name='follow'),
+    path('group/<str:slug>/', api.group_feed, name='group'),
+    path('<str:username>/', api.profile, name='profile'),
+    path('<str:username>/posts/', api.profile_posts, name='profile_posts'),
+    path('<str:username>/<int:post_id>/', api.post_detail, name='post'),
+    path('<str:username>/<int:post_id>/comments/', api.post_comments,
+         name='post_comments'),
+]
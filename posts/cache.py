@@ -0,0 +1,192 @@
+"""
+Кэш фрагментов лент с ключами по версиям.
+
+Ключ фрагмента включает имя страницы, её параметры (курсор, номер
+страницы, для ленты подписок — пользователь) и текущие версии областей
+данных, от которых фрагмент зависит. Общие ленты кэшируются одной
+копией на всех: кнопки «Редактировать» в них обёрнуты метками с id
+автора и вырезаются для всех, кроме него.
+
+Сигналы posts/signals.py увеличивают версию области при изменении
+Post, Comment или Follow, поэтому записи живут долго и перестают
+читаться ровно тогда, когда их данные поменялись.
+
+От одновременного пересчёта защищают две вещи: досрочный пересчёт с
+вероятностью, растущей к концу срока жизни (XFetch), и блокировка на
+промахе — пока один процесс рендерит, остальные отдают последнюю
+известную версию фрагмента.
+"""
+import hashlib
+import math
+import random
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import metrics, routers
+
+LOCK_TIMEOUT = 10
+XFETCH_BETA = 1.0
+EDIT_BUTTON_MARKER = '<!-- edit-button -->'
+AUTHOR_BUTTON_RE = re.compile(
+    r'<!-- edit-button:(\d+) -->(.*?)<!-- /edit-button -->', re.S)
+
+
+def version_key(scope):
+    return f'version:{scope}'
+
+
+def changed_key(scope):
+    return f'changed:{scope}'
+
+
+def scope_versions(scopes):
+    """Текущие версии областей; отсутствующие заводятся заново"""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Новая версия после вытеснения не должна совпасть со старой,
+            # поэтому версии — случайные токены, а не счётчик.
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def new_versions(scopes):
+    # Не incr: у файлового кэша это чтение и запись, и два процесса
+    # могут записать одну и ту же версию. Новый токен пишется одним set.
+    now = time.time()
+    values = {}
+    for scope in scopes:
+        values[version_key(scope)] = uuid.uuid4().hex
+        values[changed_key(scope)] = now
+    cache.set_many(values, None)
+
+
+def bump(*scopes):
+    """
+    Делает недействительными все фрагменты указанных областей.
+
+    Внутри транзакции версии меняются дважды: сразу, чтобы сама
+    транзакция видела свои изменения, и после коммита. Читатель, успевший
+    до коммита, промахивается под промежуточной версией и кладёт под неё
+    ещё старые строки — второй bump делает такую запись недостижимой.
+    """
+    new_versions(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: new_versions(scopes))
+
+
+def scope_last_modified(scopes):
+    """
+    Время последнего изменения областей (timestamp). Для вытесненной
+    области, как и для её версии, начинается новый отсчёт.
+    """
+    keys = [changed_key(scope) for scope in scopes]
+    changed = cache.get_many(keys)
+    for key in keys:
+        if key not in changed:
+            cache.add(key, time.time(), None)
+            changed[key] = cache.get(key)
+    return max(changed.values())
+
+
+class Fragment:
+    """Описание кэшируемого фрагмента, передаётся в шаблон"""
+
+    def __init__(self, name, parts=(), scopes=(), timeout=None,
+                 shared=False):
+        self.name = name
+        self.parts = tuple(parts)
+        self.scopes = tuple(scopes)
+        self.timeout = timeout or settings.FEED_CACHE_TIMEOUT
+        # Общий для всех пользователей: кнопки авторов в метках.
+        self.shared = shared
+
+    @classmethod
+    def for_request(cls, request, name, *parts, scopes=(), per_user=False):
+        """
+        Фрагмент ленты: ключ зависит от страницы (курсор или номер), а
+        при per_user — и от пользователя. Группы входят в каждую ленту
+        через карточки.
+        """
+        page = (request.GET.get('cursor', ''), request.GET.get('page', ''))
+        if per_user:
+            page += (request.user.pk or 0,)
+        return cls(name, parts + page, scopes=('groups',) + tuple(scopes),
+                   shared=not per_user)
+
+    def base_key(self):
+        raw = ':'.join(str(part) for part in (self.name,) + self.parts)
+        return 'fragment:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def key(self):
+        versions = ':'.join(str(v) for v in scope_versions(self.scopes))
+        return f'{self.base_key()}:{versions}'
+
+    def get_or_render(self, render):
+        key = self.key()
+        stale_key = self.base_key() + ':latest'
+        lock_key = self.base_key() + ':lock'
+
+        entry = cache.get(key)
+        metrics.count_cache('fragment', entry is not None)
+        if entry is not None:
+            value, delta, expires = entry
+            early = delta * XFETCH_BETA * math.log(random.random() or 1e-12)
+            if time.time() - early < expires:
+                return value
+            locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+            if not locked:
+                return value
+        else:
+            locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+            stale = None if locked else cache.get(stale_key)
+            if stale is not None:
+                return stale
+
+        # Свежие изменения могли не доехать до реплики, а фрагмент
+        # сохранится под новой версией — рендерим его с основной базы.
+        replica = routers.reading_replica()
+        if replica and routers.changed_recently(
+                scope_last_modified(self.scopes)):
+            replica = False
+        try:
+            start = time.time()
+            with routers.replica_reads(replica):
+                value = render()
+            delta = time.time() - start
+            cache.set(key, (value, delta, start + self.timeout),
+                      self.timeout)
+            cache.set(stale_key, value, self.timeout)
+        finally:
+            # Чужую блокировку (промах без прошлой версии) не снимаем.
+            if locked:
+                cache.delete(lock_key)
+        return value
+
+
+def author_button(author_id, button):
+    """Кнопка автора в общем фрагменте, см. personalize"""
+    return f'<!-- edit-button:{author_id} -->{button}<!-- /edit-button -->'
+
+
+def personalize(html, user_id):
+    """Оставляет в общем фрагменте только кнопки автора user_id"""
+    return AUTHOR_BUTTON_RE.sub(
+        lambda match: (match.group(2) if match.group(1) == str(user_id)
+                       else ''), html)
+
+
+def card_key(post, groups_version):
+    """
+    Ключ карточки поста: меняется при редактировании поста (updated),
+    новом комментарии (comment_count) и изменении любой группы.
+    """
+    return (f'card:{post.pk}:{post.updated.timestamp()}:'
+            f'{post.comment_count}:{groups_version}')
@@ -0,0 +1,85 @@
+"""
+Условные ответы (304 Not Modified) по версиям областей кэша.
+
+ETag — хэш пути запроса и версий областей из posts/cache.py,
+Last-Modified — время последнего сброса этих областей. Оба значения —
+чтение нескольких ключей кэша, поэтому 304 отдаётся до запросов ленты,
+рендера шаблона или сериализации.
+
+public_page применяет это к HTML-страницам для анонимных читателей:
+их страница одинакова для всех, поэтому ответ помечается public и
+может храниться общим обратным прокси (с перепроверкой по ETag).
+Вошедшим пользователям страница отдаётся как раньше, private.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import routers
+from .cache import scope_last_modified, scope_versions
+
+
+def validators(request, get_scopes, salt, kwargs):
+    """(etag, last_modified) запроса, считаются один раз"""
+    if not hasattr(request, '_validators'):
+        scopes = get_scopes(request, **kwargs)
+        changed = scope_last_modified(scopes)
+        if routers.reading_replica() and routers.changed_recently(changed):
+            # Реплика могла ещё не получить изменение: ETag новый, а
+            # данные старые. Такую страницу читаем с основной базы, и
+            # объекты, которые get_scopes положил в request, — тоже.
+            routers.use_replica(False)
+            scopes = get_scopes(request, **kwargs)
+        raw = ':'.join([salt, settings.RELEASE, request.get_full_path(),
+                        *scope_versions(scopes)])
+        request._validators = (
+            hashlib.md5(raw.encode()).hexdigest(),
+            datetime.fromtimestamp(changed, timezone.utc))
+    return request._validators
+
+
+def conditional(get_scopes, salt=''):
+    """
+    Представление с ETag/Last-Modified по областям get_scopes.
+    get_scopes(request, **kwargs) может найти объект из URL и положить
+    его в request, чтобы представление не искало его повторно.
+    salt отличает разные представления одного пути (HTML и JSON).
+    """
+    def decorator(view):
+        return wraps(view)(condition(
+            etag_func=lambda request, **kwargs: validators(
+                request, get_scopes, salt, kwargs)[0],
+            last_modified_func=lambda request, **kwargs: validators(
+                request, get_scopes, salt, kwargs)[1],
+        )(view))
+    return decorator
+
+
+def public_page(get_scopes):
+    """
+    HTML-страница: анонимным читателям — условный ответ, который
+    может хранить общий кэш; вошедшим — обычный private-ответ.
+    """
+    def decorator(view):
+        conditional_view = conditional(get_scopes, salt='html')(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.user.is_authenticated
+                    or request.method not in ('GET', 'HEAD')):
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True)
+                return response
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                patch_cache_control(
+                    response, public=True, max_age=0,
+                    s_maxage=settings.PUBLIC_PAGE_SHARED_MAX_AGE)
+                response.shared_cacheable = True
+            return response
+        return wrapper
+    return decorator
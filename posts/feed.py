@@ -0,0 +1,128 @@
+"""
+Лента подписок /follow/.
+
+Обычные авторы при публикации раскладывают пост по лентам подписчиков
+(TimelineEntry), и страница ленты читается диапазоном по индексу
+(user, -pub_date). Посты авторов с числом подписчиков больше
+FEED_FANOUT_LIMIT не раскладываются, а подмешиваются при чтении.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from users.models import Profile
+from .models import Post, Follow, TimelineEntry
+
+# Порядок follow_feed(keyed=True): дата и id поста из ленты или из
+# posts_post.
+FEED_ORDERING = ('-feed_date', '-feed_id')
+
+
+def is_celebrity(author_id):
+    return Profile.objects.filter(
+        user_id=author_id,
+        follower_count__gt=settings.FEED_FANOUT_LIMIT).exists()
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты всех подписчиков автора"""
+    if post.author_id is None or is_celebrity(post.author_id):
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, author_id=post.author_id,
+                       pub_date=post.pub_date)
+         for user_id in followers.iterator()],
+        batch_size=500)
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика"""
+    posts = (Post.objects.filter(author_id=author_id)
+             .order_by('-pub_date').values_list('id', 'pub_date')
+             [:settings.FEED_BACKFILL_SIZE])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=post_id, author_id=author_id,
+                       pub_date=pub_date)
+         for post_id, pub_date in posts],
+        batch_size=500, ignore_conflicts=True)
+
+
+def backfill_followers(author_id, user_ids=None):
+    """
+    backfill для подписчиков автора (всех или user_ids) одним
+    INSERT ... SELECT в базе: строк лент на порядки больше, чем
+    подписок, и объекты для них не создаются. Возвращает число строк
+    """
+    sql = [
+        connection.ops.insert_statement(ignore_conflicts=True),
+        f'{TimelineEntry._meta.db_table} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f CROSS JOIN ('
+        f'SELECT id, author_id, pub_date FROM {Post._meta.db_table} '
+        'WHERE author_id = %s ORDER BY pub_date DESC LIMIT %s) p '
+        'WHERE f.author_id = %s']
+    params = [author_id, settings.FEED_BACKFILL_SIZE, author_id]
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            # IN () — синтаксическая ошибка в PostgreSQL
+            return 0
+        sql.append(f'AND f.user_id IN ({", ".join(["%s"] * len(user_ids))})')
+        params += user_ids
+    sql.append(connection.ops.ignore_conflicts_suffix_sql(
+        ignore_conflicts=True))
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return cursor.rowcount
+
+
+def follower_left(author_id):
+    """
+    Посты, опубликованные, пока у автора было больше FEED_FANOUT_LIMIT
+    подписчиков, не разложены по лентам. Когда после отписки автор
+    снова не больше порога, ленты оставшихся подписчиков дополняются,
+    иначе эти посты пропали бы из них
+    """
+    if Profile.objects.filter(
+            user_id=author_id,
+            follower_count=settings.FEED_FANOUT_LIMIT).exists():
+        backfill_followers(author_id)
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося читателя"""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def follow_feed(user, keyed=False):
+    """
+    Посты ленты подписок пользователя, новые сверху. С keyed=True
+    ключи порядка доступны как аннотации FEED_ORDERING для
+    CursorPaginator; нумерованной пагинации они не нужны — COUNT по
+    аннотированному запросу уходит в подзапрос с GROUP BY
+    """
+    celebrities = list(
+        Follow.objects.filter(
+            user=user,
+            author__profile__follower_count__gt=settings.FEED_FANOUT_LIMIT)
+        .values_list('author_id', flat=True))
+    posts = Post.objects.for_feed()
+    if not celebrities:
+        # F(): по колонкам ленты, а не posts_post, чтобы ORDER BY и
+        # условие курсора целиком шли по индексу timeline_user_date_idx.
+        posts = posts.filter(timeline_entries__user=user)
+        date, post_id = (F('timeline_entries__pub_date'),
+                         F('timeline_entries__post_id'))
+    else:
+        timeline = TimelineEntry.objects.filter(user=user).values('post_id')
+        posts = posts.filter(
+            Q(pk__in=timeline) | Q(author_id__in=celebrities))
+        date, post_id = F('pub_date'), F('id')
+    if keyed:
+        return posts.annotate(feed_date=date, feed_id=post_id).order_by(
+            *FEED_ORDERING)
+    return posts.order_by(date.desc(), post_id.desc())
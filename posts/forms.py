@@ -1,5 +1,9 @@
+from django import forms
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.forms import ModelForm
-from .models import Post, Comment
+from .models import Post, Comment, Group
+from .uploads import reencode, validate_image, validate_size
 
 
 class PostForm(ModelForm):
@@ -18,8 +22,39 @@ class PostForm(ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Новый файл есть только у загрузки; у сохранённого поста это
+        # FieldFile, его не трогаем.
+        if not image or not hasattr(image, 'image'):
+            return image
+        validate_image(image)
+        return reencode(image)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = self.files.get('image') if self.files else None
+        if upload is not None and self.has_error('image'):
+            # Обработчик загрузки обрезает файл сверх лимита, и ImageField
+            # видит битую картинку; показываем настоящую причину.
+            try:
+                validate_size(upload)
+            except ValidationError as error:
+                del self._errors['image']
+                self.add_error('image', error)
+        return cleaned_data
+
 
 class CommentForm(ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Запрос', max_length=200)
+    group = forms.ModelChoiceField(Group.objects.all(), required=False,
+                                   to_field_name='slug', label='Группа')
+    author = forms.ModelChoiceField(get_user_model().objects.all(),
+                                    required=False, to_field_name='username',
+                                    widget=forms.TextInput, label='Автор')
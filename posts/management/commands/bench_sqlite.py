@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+
+from posts.models import Comment, Post, User
+
+# Настройки SQLite по умолчанию: журнал отката, fsync на каждый коммит,
+# новое соединение на каждый запрос.
+DEFAULT_PRAGMAS = {'busy_timeout': 5000}
+PROFILES = {
+    'default': (DEFAULT_PRAGMAS, 0),
+    'tuned': (None, 600),
+}
+
+
+def reader(post):
+    """Страница поста: пост с автором и первые комментарии"""
+    Post.objects.for_feed().get(pk=post.pk)
+    list(post.comment_paginator().forward_queryset())
+
+
+def writer(post):
+    Comment.objects.create(post=post, author=post.author, text='bench')
+
+
+def run_profile(name, options, queue):
+    """Выполняется в отдельном процессе со своей базой и настройками"""
+    pragmas, max_age = PROFILES[name]
+    if pragmas is not None:
+        settings.SQLITE_PRAGMAS = pragmas
+    database = settings.DATABASES['default']
+    database['NAME'] = os.path.join(options['directory'], f'{name}.sqlite3')
+    database['CONN_MAX_AGE'] = max_age
+    call_command('migrate', verbosity=0)
+    author = User.objects.create_user(username='bench_sqlite')
+    post = Post.objects.create(text='bench_sqlite', author=author)
+    for _ in range(options['comments']):
+        writer(post)
+    connection.close()
+
+    # Клиенты — отдельные процессы, как воркеры сервера: потоки одного
+    # процесса делили бы GIL, и читатели вытесняли бы писателей.
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    deadline = time.perf_counter() + options['seconds']
+    kinds = ['read'] * options['readers'] + ['write'] * options['writers']
+    clients = [context.Process(target=client,
+                               args=(kind, post, deadline, results))
+               for kind in kinds]
+    for process in clients:
+        process.start()
+    stats = {'read': [], 'write': [], 'errors': 0}
+    for _ in clients:
+        kind, latencies, errors = results.get()
+        stats[kind] += latencies
+        stats['errors'] += errors
+    for process in clients:
+        process.join()
+    queue.put(stats)
+
+
+def client(kind, post, deadline, results):
+    work = reader if kind == 'read' else writer
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            work(post)
+        except OperationalError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+        # Граница запроса: без CONN_MAX_AGE соединение закрывается.
+        close_old_connections()
+    connection.close()
+    results.put((kind, latencies, errors))
+
+
+def summary(latencies, seconds):
+    if not latencies:
+        return 'нет операций'
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    return f'{len(latencies) / seconds:8.1f}/с  p95 {p95:7.1f} мс'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает SQLite с настройками по умолчанию и с '
+            'SQLITE_PRAGMAS и CONN_MAX_AGE под параллельным чтением и '
+            'записью (каждый профиль — во временной базе)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--comments', type=int, default=200,
+                            help='Комментариев под постом до замера')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда сравнивает настройки SQLite')
+        connection.close()
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            options['directory'] = directory
+            for name in PROFILES:
+                queue = context.Queue()
+                process = context.Process(target=run_profile,
+                                          args=(name, options, queue))
+                process.start()
+                stats = queue.get()
+                process.join()
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{name:8} чтение {summary(stats["read"], seconds)}  '
+                    f'запись {summary(stats["write"], seconds)}  '
+                    f'ошибок блокировки {stats["errors"]}')
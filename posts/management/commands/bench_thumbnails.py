@@ -0,0 +1,90 @@
+import shutil
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import Context, Template
+from django.test import Client, override_settings
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post, User
+
+# Так карточка строила миниатюру до фоновой подготовки.
+INLINE_TEMPLATE = Template(
+    '{% load thumbnail %}{% for post in posts %}'
+    '{% thumbnail post.image "960x339" crop="center" upscale=True as im %}'
+    '{{ im.url }}{% endthumbnail %}{% endfor %}')
+
+
+class Rollback(Exception):
+    pass
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендера ленты с холодными и готовыми '
+            'миниатюрами на временных данных (всё откатывается)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10)
+        parser.add_argument('--width', type=int, default=1920)
+        parser.add_argument('--height', type=int, default=1080)
+
+    def handle(self, *args, **options):
+        media_root = tempfile.mkdtemp()
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bench-thumbnails',
+        }}
+        try:
+            with override_settings(MEDIA_ROOT=media_root, CACHES=caches):
+                with transaction.atomic():
+                    self.run(options)
+                    raise Rollback
+        except Rollback:
+            pass
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def image(self, options):
+        buffer = BytesIO()
+        Image.effect_noise((options['width'], options['height']),
+                           64).convert('RGB').save(buffer, 'jpeg')
+        return SimpleUploadedFile('bench.jpg', buffer.getvalue(),
+                                  content_type='image/jpeg')
+
+    def run(self, options):
+        author = User.objects.create_user(username='bench_thumbnails')
+        posts = [Post.objects.create(text=f'Пост {i}', author=author,
+                                     image=self.image(options))
+                 for i in range(options['posts'])]
+        client = Client()
+
+        def feed():
+            cache.clear()
+            client.get('/')
+
+        def inline():
+            INLINE_TEMPLATE.render(Context({'posts': posts}))
+
+        # Холодная подготовка — ровно то, что раньше ждал первый запрос
+        # ленты, когда {% thumbnail %} строил миниатюры при рендере.
+        results = [
+            ('лента, миниатюры не готовы (заглушки)', timed(feed)),
+            ('построение миниатюр, холодное', timed(
+                lambda: [thumbnails.generate(post.pk) for post in posts])),
+            ('лента с готовыми миниатюрами', timed(feed)),
+            ('{% thumbnail %} при рендере, тёплый', timed(inline)),
+        ]
+        for title, ms in results:
+            self.stdout.write(f'{title:<42} {ms:8.1f} мс')
@@ -0,0 +1,132 @@
+import multiprocessing
+import resource
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.models import Post, User
+
+# Обработчики Django по умолчанию: до 2,5 МБ загрузка лежит в памяти.
+DEFAULT_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def unbounded():
+    """Загрузка как до ограничений: в память и без перекодирования"""
+    stack = ExitStack()
+    stack.enter_context(override_settings(
+        FILE_UPLOAD_HANDLERS=DEFAULT_HANDLERS))
+    stack.enter_context(mock.patch.object(
+        PostForm, 'clean_image', lambda form: form.cleaned_data['image']))
+    return stack
+
+
+def run_case(case, image, limited, queue):
+    """Выполняется в отдельном процессе, чтобы пик памяти был своим"""
+    start_rss = peak_rss_mb()
+    name, content_type, content = image
+    upload = SimpleUploadedFile(name, content, content_type=content_type)
+    client = Client()
+    try:
+        with ExitStack() if limited else unbounded(), transaction.atomic():
+            author = User.objects.create_user(username='bench_uploads')
+            client.force_login(author)
+            cache.clear()
+            start = time.perf_counter()
+            if case == 'post_edit':
+                post = Post.objects.create(text='Пост', author=author)
+                response = client.post(
+                    reverse('post_edit', args=[author.username, post.pk]),
+                    {'text': 'Пост', 'image': upload})
+            else:
+                response = client.post(reverse('new_post'),
+                                       {'text': 'Пост', 'image': upload})
+            ms = (time.perf_counter() - start) * 1000
+            raise Rollback
+    except Rollback:
+        pass
+    queue.put((response.status_code, ms, peak_rss_mb() - start_rss))
+
+
+class Command(BaseCommand):
+    help = ('Загружает большие изображения через post_new и post_edit и '
+            'сравнивает пик памяти с прежней загрузкой без ограничений '
+            '(всё откатывается)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=6000)
+        parser.add_argument('--height', type=int, default=4000)
+        parser.add_argument('--bomb-side', type=int, default=8000,
+                            help='сторона PNG-«бомбы» одного цвета')
+
+    def handle(self, *args, **options):
+        photo = self.image('photo.jpg', 'JPEG',
+                           (options['width'], options['height']))
+        side = options['bomb_side']
+        bomb = self.image('bomb.png', 'PNG', (side, side), flat=True)
+        self.stdout.write(f'фото {len(photo[2]) / 2 ** 20:.1f} МБ, '
+                          f'«бомба» {len(bomb[2]) / 2 ** 20:.2f} МБ '
+                          f'на {side}×{side}')
+
+        cases = [
+            ('post_new, фото', 'post_new', photo, True),
+            ('post_edit, фото', 'post_edit', photo, True),
+            ('post_new, «бомба»', 'post_new', bomb, True),
+            ('post_new, фото, без ограничений', 'post_new', photo, False),
+            ('post_edit, фото, без ограничений', 'post_edit', photo, False),
+            ('post_new, «бомба», без ограничений', 'post_new', bomb, False),
+        ]
+        media_root = tempfile.mkdtemp()
+        context = multiprocessing.get_context('fork')
+        try:
+            with override_settings(MEDIA_ROOT=media_root,
+                                   THUMBNAIL_BACKGROUND=False):
+                for title, case, image, limited in cases:
+                    self.report(title, context, case, image, limited)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def image(self, name, image_format, size, flat=False):
+        if flat:
+            image = Image.new('RGB', size, color=(40, 90, 160))
+        else:
+            image = Image.radial_gradient('L').resize(size).convert('RGB')
+            image.paste(Image.effect_noise((size[0] // 2, size[1] // 2), 64)
+                        .convert('RGB'))
+        buffer = BytesIO()
+        image.save(buffer, image_format)
+        return name, Image.MIME[image_format], buffer.getvalue()
+
+    def report(self, title, context, case, image, limited):
+        # Каждый процесс открывает своё соединение с базой.
+        connections.close_all()
+        queue = context.Queue()
+        process = context.Process(target=run_case,
+                                  args=(case, image, limited, queue))
+        process.start()
+        status, ms, rss = queue.get()
+        process.join()
+        self.stdout.write(f'{title:<38} {status:>4} {ms:8.1f} мс '
+                          f'{rss:8.1f} МБ пик')
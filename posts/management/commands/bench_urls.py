@@ -0,0 +1,184 @@
+import json
+import math
+import os
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import metrics, urls
+from posts.models import Comment, Follow, Group, Post, User
+
+# Параметры запроса для страниц, которым нужна строка запроса.
+PARAMS = {'search': 'q'}
+
+
+def git_commit():
+    """Короткий хэш HEAD, '-dirty' при незакоммиченных изменениях"""
+    def git(*args):
+        return subprocess.run(('git',) + args, cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True,
+                              ).stdout.strip()
+    try:
+        commit = git('rev-parse', '--short', 'HEAD')
+        return commit + ('-dirty' if git('status', '--porcelain', '-uno')
+                         else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentile(values, share):
+    """Ближайший ранг: значение, не меньше которого share всех значений"""
+    values = sorted(values)
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def sample(query):
+    """
+    Аргументы адресов из текущих данных: самый плодовитый автор, его
+    самый обсуждаемый пост, группа поста (или любая непустая) и
+    читатель с самой большой лентой подписок, ещё не подписанный на
+    автора
+    """
+    post = (Post.objects.select_related('author', 'group')
+            .order_by('-author__profile__post_count', '-comment_count')
+            .first())
+    if post is None:
+        raise CommandError('Нет постов: сначала manage.py seed_bench')
+    reader = (User.objects.exclude(pk=post.author_id)
+              .exclude(follower__author=post.author_id)
+              .order_by('-profile__following_count', 'pk').first())
+    if reader is None:
+        raise CommandError('Нужен пользователь, кроме автора поста')
+    group = post.group or Group.objects.filter(posts__isnull=False).first()
+    values = {'username': post.author.username, 'post_id': post.pk,
+              'slug': group.slug if group else None, 'q': query}
+    return values, reader
+
+
+def url_cases(values):
+    """(имя, путь, GET-параметры) для каждого адреса posts/urls.py"""
+    for pattern in urls.urlpatterns:
+        kwargs = {name: values[name] for name in pattern.pattern.converters}
+        if None in kwargs.values():
+            continue
+        param = PARAMS.get(pattern.name)
+        params = {param: values[param]} if param else {}
+        yield pattern.name, reverse(pattern.name, kwargs=kwargs), params
+
+
+def summary(path, samples):
+    statuses = [status for status, _, _ in samples]
+    latencies = [seconds * 1000 for _, seconds, _ in samples]
+    recorders = [recorder for _, _, recorder in samples]
+    return {
+        'path': path,
+        'status': max(set(statuses), key=statuses.count),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'max_ms': round(max(latencies), 3),
+        'queries': statistics.median(r.query_count for r in recorders),
+        'sql_ms': round(statistics.median(
+            r.sql_time * 1000 for r in recorders), 3),
+        'template_ms': round(statistics.median(
+            r.template_time * 1000 for r in recorders), 3),
+        'duplicate_queries': max(
+            sum(n - 1 for n in r.duplicates().values()) for r in recorders),
+    }
+
+
+def change(new, old):
+    if not old:
+        return ''
+    return f' ({(new - old) / old:+.0%})'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку (p50/p95/p99) и число SQL-запросов каждого '
+            'адреса posts/urls.py на текущих данных (см. seed_bench) и '
+            'сохраняет результат в JSON для сравнения между коммитами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Замеров на адрес')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Прогревочных запросов на адрес')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--query', default='город',
+                            help='Строка для страницы поиска')
+        parser.add_argument('--output',
+                            help='Файл результата, по умолчанию '
+                                 'bench/<коммит>.json')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        values, reader = sample(options['query'])
+        cases = list(url_cases(values))
+        client = Client()
+        client.force_login(reader)
+
+        # Адреса обходятся по кругу: подписка и отписка идут в одном
+        # круге и возвращают данные в исходное состояние, а дрейф
+        # (кэш, фоновые процессы) делится между адресами поровну.
+        samples = {name: [] for name, _, _ in cases}
+        with override_settings(METRICS_SAMPLE_RATE=0, NPLUSONE_DETECT=''):
+            for round_number in range(options['warmup'] + options['repeat']):
+                for name, path, params in cases:
+                    if options['cold']:
+                        cache.clear()
+                    start = time.perf_counter()
+                    with metrics.measure() as recorder:
+                        response = client.get(path, params)
+                    seconds = time.perf_counter() - start
+                    if round_number >= options['warmup']:
+                        samples[name].append(
+                            (response.status_code, seconds, recorder))
+
+        commit = git_commit()
+        result = {
+            'commit': commit,
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'cold': options['cold'],
+            'repeat': options['repeat'],
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'urls': {name: summary(path, samples[name])
+                     for name, path, _ in cases},
+        }
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'bench', f'{commit or "results"}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)['urls']
+        for name, stats in result['urls'].items():
+            old = baseline.get(name, {})
+            self.stdout.write(
+                f'{name:18} {stats["status"]}  '
+                f'p50 {stats["p50_ms"]:7.1f} мс'
+                f'{change(stats["p50_ms"], old.get("p50_ms"))}  '
+                f'p95 {stats["p95_ms"]:7.1f} мс'
+                f'{change(stats["p95_ms"], old.get("p95_ms"))}  '
+                f'запросов {stats["queries"]:g}'
+                f'{change(stats["queries"], old.get("queries"))}')
+        self.stdout.write(f'Результат: {output}')
@@ -0,0 +1,78 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from posts import writes
+from posts.models import Comment, Post, User
+
+
+def single(post, author, text):
+    """Прежний путь: Comment.save() и сигналы, каждый запрос в autocommit"""
+    Comment.objects.create(post=post, author=author, text=text)
+
+
+def batched(post, author, text):
+    writes.save_comment(Comment(post=post, author=author, text=text))
+
+
+class Command(BaseCommand):
+    help = ('Пишет комментарии из нескольких потоков одиночными INSERT и '
+            'через групповой коммит posts/writes.py и сравнивает '
+            'пропускную способность, задержки и ошибки блокировки '
+            '(записи удаляются)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--comments', type=int, default=50,
+                            help='Комментариев на поток')
+        parser.add_argument('--busy-timeout', type=float, default=None,
+                            help='Таймаут ожидания блокировки SQLite, с')
+
+    def handle(self, *args, **options):
+        if options['busy_timeout'] is not None:
+            connection.close()
+            settings.DATABASES['default'].setdefault('OPTIONS', {})[
+                'timeout'] = options['busy_timeout']
+        author = User.objects.create_user(username='bench_writes')
+        post = Post.objects.create(text='bench_writes', author=author)
+        try:
+            for name, write in (('single', single), ('batched', batched)):
+                self.run(name, write, post, author, options)
+        finally:
+            author.delete()
+
+    def run(self, name, write, post, author, options):
+        latencies, errors = [], []
+
+        def client():
+            try:
+                for number in range(options['comments']):
+                    start = time.perf_counter()
+                    try:
+                        write(post, author, f'Комментарий {number}')
+                    except OperationalError as error:
+                        errors.append(error)
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client)
+                   for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        written = len(latencies) - len(errors)
+        self.stdout.write(
+            f'{name:8} {written / elapsed:8.1f} комментариев/с  '
+            f'p50 {latencies[len(latencies) // 2] * 1000:7.1f} мс  '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} мс  '
+            f'ошибок блокировки {len(errors)}')
+        if write is batched:
+            self.stdout.write(f'         {writes.comment_buffer.metrics()}')
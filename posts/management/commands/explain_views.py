@@ -0,0 +1,141 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts import urls as posts_urls
+from posts.routers import STICKY_COOKIE
+from posts.models import Group, Post, Comment, Follow
+from posts.paginator import CursorPaginator
+
+User = get_user_model()
+
+# Запросы, которым полный просмотр таблицы разрешён: список групп
+# для выпадающего списка в PostForm читается целиком намеренно.
+ALLOWED_SCANS = (
+    'FROM "posts_group"',
+)
+CURSOR_VIEWS = ('index', 'group', 'profile')
+# Страницы рендерятся с отдельным кэшем в памяти процесса: версии
+# областей, которые увеличивают сигналы временных данных, и фрагменты
+# страниц не должны попасть в общий кэш сайта.
+EXPLAIN_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'explain_views',
+    }
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def sqlite_problems(plan):
+    problems = []
+    for row in plan:
+        detail = row[-1]
+        if 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+        elif (detail.startswith('SCAN ') and 'USING' not in detail
+              and 'CONSTANT ROW' not in detail):
+            problems.append(detail)
+    return problems
+
+
+def postgresql_problems(plan):
+    problems = []
+    for (line,) in plan:
+        node = line.strip().lstrip('->').strip()
+        if node.startswith('Seq Scan') or node.startswith('Sort '):
+            problems.append(node)
+    return problems
+
+
+def explain(sql, params):
+    """Возвращает список проблем плана запроса для текущей БД"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return sqlite_problems(cursor.fetchall())
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик выбирает Seq Scan
+            # даже при наличии индекса, поэтому запрещаем его явно.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            return postgresql_problems(cursor.fetchall())
+    raise CommandError(f'EXPLAIN для {connection.vendor} не поддерживается')
+
+
+class Command(BaseCommand):
+    help = ('Выполняет все страницы posts/urls.py на временных данных и '
+            'проверяет планы их SELECT-запросов: полный просмотр таблицы '
+            'или сортировка во временном B-дереве считаются ошибкой')
+
+    def handle(self, *args, **options):
+        failures = []
+        # Временные данные создаются в транзакции, которая всегда
+        # откатывается, поэтому в базе от команды ничего не остаётся.
+        try:
+            with override_settings(CACHES=EXPLAIN_CACHES), \
+                    transaction.atomic():
+                for url, queries in self.capture().items():
+                    for query in queries:
+                        failures.extend(self.check_query(url, query))
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            for url, sql, problem in failures:
+                self.stderr.write(f'{url}: {problem}\n    {sql}')
+            raise CommandError(f'Запросов с плохим планом: {len(failures)}')
+        self.stdout.write('Все запросы используют индексы')
+
+    def capture(self):
+        author = User.objects.create_user(username='explain_author')
+        reader = User.objects.create_user(username='explain_reader')
+        group = Group.objects.create(title='explain', slug='explain-group',
+                                     description='explain')
+        post = Post.objects.create(text='explain', author=author, group=group)
+        Comment.objects.create(post=post, author=reader, text='explain')
+        Follow.objects.create(user=reader, author=author)
+
+        client = Client()
+        client.force_login(reader)
+        # Временные данные есть только в незакоммиченной транзакции
+        # основной базы, поэтому страницы не должны читать с реплики.
+        client.cookies[STICKY_COOKIE] = str(time.time() + 3600)
+        values = {'username': author.username, 'post_id': post.id,
+                  'slug': group.slug}
+        cursor = CursorPaginator(Post.objects.all(), 1).encode_cursor(post)
+
+        captured = {}
+        for pattern in posts_urls.urlpatterns:
+            kwargs = {name: values[name]
+                      for name in pattern.pattern.converters}
+            url = reverse(pattern.name, kwargs=kwargs)
+            with CaptureQueriesContext(connection) as context:
+                client.get(url)
+            captured[url] = context.captured_queries
+            if pattern.name in CURSOR_VIEWS:
+                with CaptureQueriesContext(connection) as context:
+                    client.get(url, {'cursor': cursor})
+                captured[f'{url}?cursor'] = context.captured_queries
+        return captured
+
+    def check_query(self, url, query):
+        sql = query['sql']
+        if not sql.startswith('SELECT'):
+            return []
+        if any(allowed in sql and ' WHERE ' not in sql
+               for allowed in ALLOWED_SCANS):
+            return []
+        # В captured_queries параметры уже подставлены, поэтому
+        # EXPLAIN выполняется для готового текста без параметров.
+        return [(url, sql, problem) for problem in explain(sql, ())]
@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+def file_format(path, chosen):
+    if chosen:
+        return chosen
+    return 'csv' if path and path.endswith('.csv') else 'ndjson'
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в NDJSON или '
+            'CSV потоком, не загружая таблицы в память '
+            '(см. posts/transfer.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-',
+                            help='Файл, по умолчанию stdout')
+        parser.add_argument('--format', choices=sorted(transfer.WRITERS),
+                            help='По умолчанию по расширению файла')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['output']
+        records = transfer.export_records(options['chunk_size'])
+        write = transfer.WRITERS[file_format(path, options['format'])]
+        if path == '-':
+            write(sys.stdout, records)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            write(file, records)
@@ -0,0 +1,64 @@
+import json
+import os
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import transfer
+from posts.management.commands.export_posts import file_format
+
+
+class Command(BaseCommand):
+    help = ('Загружает файл export_posts пачками bulk_create. Прогресс '
+            'пишется после каждой пачки, --resume продолжает прерванную '
+            'загрузку (см. posts/transfer.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(transfer.READERS),
+                            help='По умолчанию по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true',
+                            help='Продолжить с места из файла прогресса')
+        parser.add_argument('--progress',
+                            help='Файл прогресса, по умолчанию '
+                                 '<path>.progress')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        progress = options['progress'] or f'{path}.progress'
+        done = 0
+        if os.path.exists(progress):
+            if not options['resume']:
+                raise CommandError(
+                    f'Есть незавершённая загрузка: --resume продолжит её, '
+                    f'удалите {progress}, чтобы начать заново')
+            with open(progress, encoding='utf-8') as file:
+                done = json.load(file)['records']
+            self.stdout.write(f'Продолжение с записи {done + 1}')
+
+        def on_batch(count):
+            nonlocal done
+            done += count
+            with open(progress, 'w', encoding='utf-8') as file:
+                json.dump({'records': done}, file)
+
+        read = transfer.READERS[file_format(path, options['format'])]
+        importer = transfer.Importer()
+        with open(path, encoding='utf-8', newline='') as file:
+            try:
+                importer.run(read(file, skip=done), options['batch_size'],
+                             on_batch)
+            except (KeyError, ValueError, IntegrityError) as error:
+                raise CommandError(
+                    f'Ошибка в пачке после записи {done}: {error!r}')
+        if os.path.exists(progress):
+            os.remove(progress)
+
+        # Счётчики и кэш страниц — как после сигналов posts/signals.py.
+        call_command('repair_counters', stdout=self.stdout)
+        cache.clear()
+        for kind, count in importer.loaded.items():
+            self.stdout.write(f'{kind}: загружено {count}')
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import (Count, F, IntegerField, OuterRef, Q,
+                              Subquery)
+from django.db.models.functions import Coalesce
+
+from posts.models import Post, Comment, Follow, User
+from users.models import Profile
+
+
+def count_of(model, field, outer):
+    """Коррелированный подзапрос COUNT(*) по строкам model.field = outer"""
+    rows = (model.objects.filter(**{field: OuterRef(outer)}).order_by()
+            .values(field).annotate(total=Count('pk')).values('total'))
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики (Post.comment_count, '
+            'Profile.post_count/follower_count/following_count) и '
+            'исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+
+        missing = User.objects.filter(profile__isnull=True)
+        self.stdout.write(f'Профилей без записи: {missing.count()}')
+        if not self.dry_run:
+            # Без batch_size: Django 2.2 не ограничил бы его лимитом
+            # SQLite на вставку одной колонки (500 строк).
+            for pks in chunks(list(missing.values_list('pk', flat=True)),
+                              self.batch_size):
+                Profile.objects.bulk_create(
+                    [Profile(user_id=pk) for pk in pks])
+
+        self.repair(Post, {
+            'comment_count': count_of(Comment, 'post', 'pk'),
+        })
+        self.repair(Profile, {
+            'post_count': count_of(Post, 'author', 'user'),
+            'follower_count': count_of(Follow, 'author', 'user'),
+            'following_count': count_of(Follow, 'user', 'user'),
+        })
+
+    def repair(self, model, counters):
+        actual = {f'actual_{name}': expr for name, expr in counters.items()}
+        drift = Q()
+        for name in counters:
+            drift |= ~Q(**{name: F(f'actual_{name}')})
+        drifted = list(model.objects.annotate(**actual).filter(drift)
+                       .values_list('pk', flat=True))
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: расхождений {len(drifted)}')
+        if self.dry_run:
+            return
+        for pks in chunks(drifted, self.batch_size):
+            with transaction.atomic():
+                model.objects.filter(pk__in=pks).update(**counters)
@@ -0,0 +1,239 @@
+import itertools
+import random
+import time
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import feed, search
+from posts.transfer import record_dates
+from posts.models import Comment, Follow, Group, Post, User
+from users.models import Profile
+
+USER_PREFIX = 'bench_'
+GROUP_PREFIX = 'bench-'
+WORDS = (
+    'город', 'дом', 'утро', 'вечер', 'река', 'лес', 'кот', 'собака',
+    'книга', 'письмо', 'дорога', 'поезд', 'море', 'снег', 'дождь',
+    'солнце', 'друг', 'работа', 'музыка', 'фильм', 'кофе', 'чай', 'сад',
+    'окно', 'улица', 'парк', 'весна', 'осень', 'зима', 'лето', 'новый',
+    'старый', 'тихий', 'долгий', 'красивый', 'интересный', 'сегодня',
+    'вчера', 'снова', 'наконец', 'читать', 'писать', 'гулять', 'думать',
+    'смотреть', 'слушать', 'ждать', 'помнить', 'ёлка', 'мёд',
+)
+
+
+def power_law(rng, count, alpha=1.1):
+    """
+    Индекс от 0 до count - 1 с тяжёлым хвостом (распределение Ломакса):
+    около половины выборок приходится на первые 0,1 % индексов
+    """
+    head = max(1, count // 1000)
+    while True:
+        index = int(head * (rng.paretovariate(alpha) - 1))
+        if index < count:
+            return index
+
+
+def sentence(rng, low, high):
+    text = ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+    return text.capitalize() + '.'
+
+
+def new_ids(model, after):
+    """id строк, созданных после after, по возрастанию, без лишней памяти"""
+    rows = (model.objects.filter(pk__gt=after).order_by('pk')
+            .values_list('pk', flat=True))
+    return array('q', rows.iterator(chunk_size=10000))
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max('pk'))['last'] or 0
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими данными для нагрузочных тестов: '
+            'пользователи, группы, посты и комментарии со степенным '
+            'распределением популярности и граф подписок. Пишет '
+            'bulk_create пачками и затем восстанавливает то, что обычно '
+            'делают сигналы: счётчики, поисковый индекс и ленты подписок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Одинаковый seed даёт одинаковые данные')
+        parser.add_argument('--flush', action='store_true',
+                            help='Удалить данные прошлого запуска')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        bench_users = User.objects.filter(username__startswith=USER_PREFIX)
+        if bench_users.exists():
+            if not options['flush']:
+                raise CommandError('Данные seed_bench уже есть: --flush '
+                                   'удалит их (на миллионах строк быстрее '
+                                   'пересоздать базу)')
+            self.step('Удаление прошлых данных', self.flush, bench_users)
+
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        with record_dates():
+            self.step('Пользователи', self.create_users, options['users'])
+            self.step('Группы', self.create_groups, options['groups'])
+            self.step('Подписки', self.create_follows, options['follows'])
+            self.step('Посты', self.create_posts, options['posts'])
+            self.step('Комментарии', self.create_comments,
+                      options['comments'])
+
+        # bulk_create не вызывает сигналы posts/signals.py.
+        call_command('repair_counters', batch_size=self.batch_size,
+                     stdout=self.stdout)
+        self.step('Поисковый индекс', self.index_posts)
+        self.step('Ленты подписок', self.fill_timelines)
+        cache.clear()
+
+    def step(self, title, func, *args):
+        start = time.perf_counter()
+        count = func(*args)
+        self.stdout.write(f'{title}: {count} за '
+                          f'{time.perf_counter() - start:.1f} с')
+
+    def insert(self, model, objects):
+        """bulk_create пачками по batch_size, каждая в своей транзакции"""
+        objects, total = iter(objects), 0
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return total
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            total += len(batch)
+
+    def flush(self, bench_users):
+        count = bench_users.count()
+        bench_users.delete()
+        Group.objects.filter(slug__startswith=GROUP_PREFIX).delete()
+        return count
+
+    def create_users(self, count):
+        after = last_id(User)
+        password = make_password(None)
+        self.insert(User, (User(username=f'{USER_PREFIX}{number}',
+                                password=password)
+                           for number in range(count)))
+        self.user_ids = new_ids(User, after)
+        return len(self.user_ids)
+
+    def create_groups(self, count):
+        after = last_id(Group)
+        self.insert(Group, (
+            Group(title=f'Группа {number}', slug=f'{GROUP_PREFIX}{number}',
+                  description=sentence(self.rng, 5, 20))
+            for number in range(count)))
+        self.group_ids = new_ids(Group, after)
+        return len(self.group_ids)
+
+    def create_follows(self, average):
+        """Популярных авторов читают многие: граф со степенным хвостом"""
+        return self.insert(Follow, self.follows(average))
+
+    def follows(self, average):
+        rng, user_ids = self.rng, self.user_ids
+        users = len(user_ids)
+        limit = min(users - 1, average * 10)
+        for index, user_id in enumerate(user_ids):
+            wanted = min(limit, int(rng.expovariate(1 / average))
+                         if average else 0)
+            authors = set()
+            for _ in range(wanted * 20):
+                if len(authors) >= wanted:
+                    break
+                author = power_law(rng, users)
+                if author != index:
+                    authors.add(author)
+            for author in sorted(authors):
+                yield Follow(user_id=user_id, author_id=user_ids[author])
+
+    def post_date(self, index, count):
+        """Посты идут равномерно от start до now в порядке id"""
+        return self.start + (self.now - self.start) * (index / count)
+
+    def create_posts(self, count):
+        after = last_id(Post)
+        self.insert(Post, self.posts(count))
+        self.post_ids = new_ids(Post, after)
+        return len(self.post_ids)
+
+    def posts(self, count):
+        rng, user_ids, group_ids = self.rng, self.user_ids, self.group_ids
+        for index in range(count):
+            group_id = None
+            if group_ids and rng.random() < 0.7:
+                group_id = group_ids[power_law(rng, len(group_ids))]
+            date = self.post_date(index, count)
+            yield Post(text=sentence(rng, 5, 60),
+                       author_id=user_ids[power_law(rng, len(user_ids))],
+                       group_id=group_id, pub_date=date, updated=date)
+
+    def create_comments(self, count):
+        if not self.post_ids:
+            return 0
+        return self.insert(Comment, self.comments(count))
+
+    def comments(self, count):
+        """Свежие посты обсуждают чаще, комментарии — вскоре после поста"""
+        rng, user_ids, post_ids = self.rng, self.user_ids, self.post_ids
+        posts = len(post_ids)
+        for _ in range(count):
+            index = posts - 1 - power_law(rng, posts)
+            date = self.post_date(index, posts)
+            yield Comment(
+                post_id=post_ids[index],
+                author_id=user_ids[rng.randrange(len(user_ids))],
+                text=sentence(rng, 3, 30),
+                created=date + (self.now - date) * rng.random() ** 3)
+
+    def post_chunks(self):
+        for offset in range(0, len(self.post_ids), self.batch_size):
+            chunk = self.post_ids[offset:offset + self.batch_size]
+            yield Post.objects.filter(pk__gte=chunk[0], pk__lte=chunk[-1])
+
+    def index_posts(self):
+        for posts in self.post_chunks():
+            with transaction.atomic():
+                search.index_posts(posts.values_list('id', 'text'))
+        return len(self.post_ids)
+
+    def fill_timelines(self):
+        """
+        Как будто подписки оформлены после публикаций: подписчик обычного
+        автора получает FEED_BACKFILL_SIZE его последних постов
+        (feed.backfill_followers), посты знаменитостей подмешиваются при
+        чтении
+        """
+        authors = Profile.objects.filter(
+            user_id__gte=self.user_ids[0], user_id__lte=self.user_ids[-1],
+            post_count__gt=0, follower_count__gt=0,
+            follower_count__lte=settings.FEED_FANOUT_LIMIT,
+        ).order_by('user_id').values_list('user_id', flat=True)
+        return sum(feed.backfill_followers(author_id)
+                   for author_id in list(authors))
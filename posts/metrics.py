@@ -0,0 +1,248 @@
+"""
+Метрики запросов: число и время SQL, повторяющиеся запросы, время
+рендера шаблонов, попадания в кэш фрагментов и карточек.
+
+Замеряется доля METRICS_SAMPLE_RATE запросов. Для остальных
+MetricsMiddleware делает одну проверку random(), а шаблоны и кэш —
+одно чтение thread-local. Замеренный ответ получает заголовок
+Server-Timing, а суммы по представлениям копятся в памяти процесса и
+отдаются в формате Prometheus на /metrics (по токену METRICS_TOKEN).
+Каждый воркер считает свои метрики, Prometheus опрашивает их отдельно.
+"""
+import hashlib
+import hmac
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+state = threading.local()
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LIMIT = re.compile(r'\b(LIMIT|OFFSET) \d+')
+
+
+def fingerprint(sql):
+    """SQL без значений: запросы, различающиеся только ими, совпадают"""
+    return LIMIT.sub(r'\1 ?', IN_LIST.sub('IN (...)', sql))
+
+
+def fingerprint_id(sql):
+    return hashlib.md5(fingerprint(sql).encode()).hexdigest()[:12]
+
+
+class RequestMetrics:
+    """Замер одного запроса; он же обёртка connection.execute_wrapper"""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries[fingerprint(sql)] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    def duplicates(self):
+        """{отпечаток: число выполнений} для запросов, выполненных >1 раза"""
+        return {sql: count for sql, count in self.queries.items()
+                if count > 1}
+
+    def server_timing(self, duration):
+        hits = sum(n for (_, result), n in self.cache.items()
+                   if result == 'hit')
+        misses = sum(self.cache.values()) - hits
+        duplicates = sum(n - 1 for n in self.duplicates().values())
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.query_count} queries, {duplicates} duplicate"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hit={hits} miss={misses}"',
+            f'total;dur={duration * 1000:.1f}',
+        ))
+
+
+def current():
+    return getattr(state, 'metrics', None)
+
+
+@contextmanager
+def measure():
+    """Замер блока кода: SQL всех баз, рендер шаблонов и кэш"""
+    recorder = RequestMetrics()
+    state.metrics = recorder
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(recorder))
+            yield recorder
+    finally:
+        state.metrics = None
+
+
+def count_cache(name, hit):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache[name, 'hit' if hit else 'miss'] += 1
+
+
+class TimedTemplate:
+    """Шаблон, время рендера которого без SQL идёт в замер запроса"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = current()
+        if metrics is None:
+            return self.template.render(context, request)
+        # Вложенные render_to_string (карточки) входят во внешний рендер.
+        metrics.template_depth += 1
+        start, sql_before = time.perf_counter(), metrics.sql_time
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += (time.perf_counter() - start
+                                          - (metrics.sql_time - sql_before))
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def sample(name, labels, value):
+    label_text = ','.join(f'{key}="{escape(label)}"' for key, label in labels)
+    return f'{name}{{{label_text}}} {value:g}'
+
+
+class Registry:
+    """Суммы замеров по представлениям в памяти процесса"""
+
+    METRICS = (
+        ('yatube_requests_total', 'counter',
+         'Замеренные запросы по представлению, методу и статусу'),
+        ('yatube_request_seconds_total', 'counter',
+         'Суммарное время замеренных запросов'),
+        ('yatube_db_queries_total', 'counter', 'Число SQL-запросов'),
+        ('yatube_db_seconds_total', 'counter', 'Суммарное время SQL'),
+        ('yatube_db_duplicate_queries_total', 'counter',
+         'Повторные выполнения одного отпечатка SQL в запросе'),
+        ('yatube_template_seconds_total', 'counter',
+         'Время рендера шаблонов без SQL'),
+        ('yatube_cache_requests_total', 'counter',
+         'Обращения к кэшу фрагментов и карточек'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collectors = []
+        self.reset()
+
+    def add_collector(self, collect):
+        """
+        collect() возвращает [(имя, тип, справка, метки, значение)] —
+        текущее состояние, которое не копится в record (например,
+        очередь записи). Вызывается при каждом render.
+        """
+        self.collectors.append(collect)
+
+    def reset(self):
+        self.values = defaultdict(float)
+        # Отпечаток в метке — хэш, полный SQL выводится комментарием.
+        self.fingerprints = {}
+
+    def record(self, view, method, status, metrics, duration):
+        with self.lock:
+            values = self.values
+            values['yatube_requests_total', (
+                ('view', view), ('method', method),
+                ('status', status))] += 1
+            labels = (('view', view),)
+            values['yatube_request_seconds_total', labels] += duration
+            values['yatube_db_queries_total', labels] += metrics.query_count
+            values['yatube_db_seconds_total', labels] += metrics.sql_time
+            values['yatube_template_seconds_total',
+                   labels] += metrics.template_time
+            for sql, count in metrics.duplicates().items():
+                key = fingerprint_id(sql)
+                self.fingerprints[key] = sql
+                values['yatube_db_duplicate_queries_total',
+                       labels + (('fingerprint', key),)] += count - 1
+            for (name, result), count in metrics.cache.items():
+                values['yatube_cache_requests_total',
+                       labels + (('cache', name),
+                                 ('result', result))] += count
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+            fingerprints = dict(self.fingerprints)
+        lines = []
+        for name, kind, help_text in self.METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(values.items(),
+                                                  key=str):
+                if metric != name:
+                    continue
+                lines.append(sample(name, labels, value))
+        collected = {}
+        for collect in self.collectors:
+            for name, kind, help_text, labels, value in collect():
+                collected.setdefault((name, kind, help_text), []).append(
+                    (labels, value))
+        for (name, kind, help_text), samples in collected.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(sample(name, labels, value))
+        for key, sql in sorted(fingerprints.items()):
+            lines.append(f'# fingerprint {key} {escape(sql)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def prometheus(request):
+    """Метрики процесса в текстовом формате Prometheus"""
+    # Не REMOTE_ADDR: за обратным прокси на том же хосте любой запрос
+    # пришёл бы с 127.0.0.1.
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(header.encode(),
+                                            f'Bearer {token}'.encode()):
+        raise Http404
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -0,0 +1,110 @@
+import random
+import time
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+
+from . import metrics, nplusone, routers
+
+
+class SharedCacheMiddleware:
+    """
+    Убирает Vary: Cookie у страниц, помеченных public_page для
+    анонимного читателя: SessionMiddleware добавляет его при любом
+    обращении к request.user, и общий кэш хранил бы по копии на каждый
+    набор cookie. Если на странице использован CSRF-токен, ответ
+    остаётся личным. Стоит в MIDDLEWARE выше SessionMiddleware, чтобы
+    обрабатывать ответ после неё.
+
+    Обратный прокси не должен отдавать из кэша запросы с cookie сессии.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not getattr(response, 'shared_cacheable', False):
+            return response
+        if request.META.get('CSRF_COOKIE_USED'):
+            del response['Cache-Control']
+            patch_cache_control(response, private=True)
+            return response
+        if response.has_header('Vary'):
+            vary = [header.strip() for header in response['Vary'].split(',')
+                    if header.strip().lower() != 'cookie']
+            if vary:
+                response['Vary'] = ', '.join(vary)
+            else:
+                del response['Vary']
+        return response
+
+
+class PrimaryStickyMiddleware:
+    """
+    После запроса, который мог что-то записать, ставит cookie, и
+    REPLICA_MAX_LAG секунд запросы браузера читают с основной базы
+    (posts/routers.py), пока запись не доехала до реплики.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (routers.replica_configured()
+                and request.method not in routers.SAFE_METHODS
+                and response.status_code < 400):
+            lag = settings.REPLICA_MAX_LAG
+            response.set_cookie(routers.STICKY_COOKIE,
+                                str(time.time() + lag), max_age=lag,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Замеряет долю METRICS_SAMPLE_RATE запросов (posts/metrics.py):
+    SQL всех баз, шаблоны и кэш, заголовок Server-Timing и суммы для
+    /metrics. Стоит первым в MIDDLEWARE, чтобы учесть запросы сессии
+    и пользователя.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.METRICS_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with metrics.measure() as recorder:
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.registry.record(view, request.method, response.status_code,
+                                recorder, duration)
+        response['Server-Timing'] = recorder.server_timing(duration)
+        return response
+
+
+class NPlusOneMiddleware:
+    """
+    На стенде ищет N+1 запросы в каждом запросе (posts/nplusone.py):
+    NPLUSONE_DETECT = 'log' пишет их в лог, 'raise' превращает в
+    ошибку, пустое значение выключает проверку.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        action = settings.NPLUSONE_DETECT
+        if not action:
+            return self.get_response(request)
+        label = f'{request.method} {request.path}'
+        with nplusone.detect(action=action, label=label):
+            return self.get_response(request)
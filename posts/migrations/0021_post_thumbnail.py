@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.CharField(blank=True, editable=False, help_text='Строится в фоне, см. posts/thumbnails.py', max_length=255, verbose_name='Миниатюра карточки'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='variants',
+            field=models.TextField(blank=True, editable=False, help_text='JSON: формат -> [ширина, путь]', verbose_name='Варианты изображения'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def create_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE posts_post_fts USING fts5('
+            "text, tokenize = 'unicode61 remove_diacritics 2')")
+        for post_id, text in Post.objects.values_list(
+                'id', 'text').iterator():
+            schema_editor.execute(
+                'INSERT INTO posts_post_fts (rowid, text) VALUES (%s, %s)',
+                [post_id, normalize(text)])
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE posts_post_search ('
+            'post_id integer PRIMARY KEY REFERENCES posts_post (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)')
+        schema_editor.execute(
+            'CREATE INDEX posts_post_search_document_gin '
+            'ON posts_post_search USING GIN (document)')
+        schema_editor.execute(
+            'INSERT INTO posts_post_search (post_id, document) '
+            "SELECT id, to_tsvector(%s::regconfig, "
+            "replace(lower(text), 'ё', 'е')) FROM posts_post",
+            [settings.SEARCH_CONFIG])
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE posts_post_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,6 +1,11 @@
+import json
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from .paginator import CursorPaginator
+
 User = get_user_model()
 
 
@@ -21,11 +26,22 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Посты для карточек ленты: автор и группа подтягиваются одним
+        JOIN, чтобы include/post_item.html не делал запросов на каждый
+        пост. Число комментариев хранится в самом посте (comment_count).
+        """
+        return self.select_related('author', 'group')
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Текст сообщения',
                             help_text=('Обязательное поле,'
                                        'не должно быть пустым'))
     pub_date = models.DateTimeField('date published', auto_now_add=True)
+    updated = models.DateTimeField('date updated', auto_now=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, blank=True,
                                null=True, related_name='posts',
                                verbose_name='Автор',
@@ -35,14 +51,85 @@ class Post(models.Model):
                               verbose_name='Группа',
                               help_text='Выберите название группы')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    thumbnail = models.CharField(max_length=255, blank=True, editable=False,
+                                 verbose_name='Миниатюра карточки',
+                                 help_text='Строится в фоне, '
+                                           'см. posts/thumbnails.py')
+    variants = models.TextField(blank=True, editable=False,
+                                verbose_name='Варианты изображения',
+                                help_text='JSON: формат -> [ширина, путь]')
+    comment_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Комментариев',
+        help_text='Поддерживается сигналами, см. posts/signals.py')
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (models.Index(fields=('-pub_date', '-id'),
+                                name='post_date_idx'),
+                   models.Index(fields=('group', '-pub_date', '-id'),
+                                name='post_group_date_idx'),
+                   models.Index(fields=('author', '-pub_date', '-id'),
+                                name='post_author_date_idx'))
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:15]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Группа на момент загрузки: при смене группы сигналы сбрасывают
+        # кэш и старой, и новой ленты группы.
+        instance._loaded_group_id = instance.__dict__.get('group_id')
+        return instance
+
+    @property
+    def thumbnail_url(self):
+        if not self.thumbnail:
+            return ''
+        return self.image.storage.url(self.thumbnail)
+
+    def variant_sources(self):
+        try:
+            return json.loads(self.variants) if self.variants else {}
+        except ValueError:
+            return {}
+
+    def image_srcsets(self):
+        """Список (MIME-тип, srcset) для <picture>, JPEG последним"""
+        storage = self.image.storage
+        return [
+            (f'image/{image_format}',
+             ', '.join(f'{storage.url(name)} {width}w'
+                       for width, name in sources))
+            for image_format, sources in self.variant_sources().items()
+        ]
+
+    def comment_paginator(self, per_page=None):
+        """
+        Комментарии с авторами, новые первыми, keyset-страницами по
+        (created, id): страница любой глубины — один запрос по индексу
+        comment_post_created_idx, весь тред в память не загружается.
+        """
+        return CursorPaginator(self.comments.select_related('author'),
+                               per_page or settings.COMMENTS_PAGE_SIZE,
+                               ordering=('-created', '-id'))
+
+    def save(self, *args, **kwargs):
+        # Счётчик comment_count меняется только через F()-выражения,
+        # а миниатюру пишет фоновая задача, поэтому при обычном
+        # сохранении поста их не перезаписываем значениями из памяти.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in ('comment_count', 'thumbnail',
+                                       'variants')
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -61,6 +148,10 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('-created',)
+        indexes = (models.Index(fields=('post', '-created', '-id'),
+                                name='comment_post_created_idx'),
+                   models.Index(fields=('-created', '-id'),
+                                name='comment_created_idx'))
         verbose_name_plural = 'Комментарии к постам'
 
     def __str__(self):
@@ -75,7 +166,36 @@ class Follow(models.Model):
                                related_name='following', verbose_name='Автора')
 
     class Meta:
-        constraints = (models.UniqueConstraint(fields=('user', 'author'),
-                                               name='Пара уникальных значений')
-                       )
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='Пара уникальных значений'),
+        )
+        indexes = (models.Index(fields=('author', 'user'),
+                                name='follow_author_user_idx'),)
         verbose_name_plural = 'Пользователи / Подписки'
+
+
+class TimelineEntry(models.Model):
+    """
+    Материализованная лента подписок: строка на пару (читатель, пост).
+    Заполняется при публикации поста (fan-out on write), см. posts/feed.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline',
+                             verbose_name='Читатель')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries',
+                             verbose_name='Пост')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+', verbose_name='Автор поста')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации поста')
+
+    class Meta:
+        constraints = (models.UniqueConstraint(fields=('user', 'post'),
+                                               name='timeline_user_post'),
+                       )
+        indexes = (models.Index(fields=('user', '-pub_date', '-post'),
+                                name='timeline_user_date_idx'),
+                   models.Index(fields=('user', 'author'),
+                                name='timeline_user_author_idx'))
+        verbose_name_plural = 'Ленты подписок'
@@ -0,0 +1,141 @@
+"""
+Поиск N+1 запросов.
+
+Детектор — обёртка connection.execute_wrapper. Каждый SELECT он
+группирует по отпечатку SQL (metrics.fingerprint: значения, списки IN
+и LIMIT отброшены) и по месту, откуда запрос пришёл:
+
+* строка шаблона — для запросов из {% for %} и {{ item.author }};
+* ленивое обращение к связи — post.author, post.comments.count();
+* иначе первая строка кода проекта в стеке.
+
+Если одинаковый по форме запрос из одного места выполнен
+NPLUSONE_THRESHOLD раз и больше, это N+1. NPlusOneMiddleware проверяет
+каждый HTTP-запрос отдельно: на стенде NPLUSONE_DETECT = 'log' пишет
+предупреждение в лог, в тестах 'raise' бросает NPlusOneError, и
+тестовый клиент пробрасывает его в тест. Блок кода проверяет
+detect(). Записи не проверяются: пачки INSERT — не N+1.
+
+Для pytest есть фикстура nplusone (posts/pytest_plugin.py).
+"""
+import logging
+import os
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.fields.related_descriptors import (
+    ForwardManyToOneDescriptor, ReverseOneToOneDescriptor)
+from django.template.base import Node
+
+from .metrics import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Обёртки execute_wrapper — не место запроса.
+WRAPPERS = (__file__, os.path.join(os.path.dirname(__file__), 'metrics.py'))
+
+
+class NPlusOneError(AssertionError):
+    pass
+
+
+def lazy_access(kind, obj):
+    """Имя связи, если obj — её дескриптор или менеджер"""
+    if issubclass(kind, (ForwardManyToOneDescriptor,
+                         ReverseOneToOneDescriptor)):
+        field = getattr(obj, 'field', None) or obj.related.field
+        return f'{field.model.__name__}.{field.name}'
+    # Менеджеры обратных связей создаются фабрикой, у них есть
+    # instance и field: post.comments — менеджер с field Comment.post.
+    if (kind.__name__ in ('RelatedManager', 'ManyRelatedManager')
+            and hasattr(obj, 'instance')):
+        name = (getattr(obj, 'prefetch_cache_name', None)
+                or obj.field.remote_field.get_accessor_name())
+        return f'{type(obj.instance).__name__}.{name}'
+    return None
+
+
+def project_line(frame):
+    filename = frame.f_code.co_filename
+    if (not filename.startswith(settings.BASE_DIR)
+            or filename in WRAPPERS or 'site-packages' in filename):
+        return None
+    path = os.path.relpath(filename, settings.BASE_DIR)
+    return f'{path}:{frame.f_lineno}'
+
+
+def origin(frame):
+    """(место, связь) для запроса, выполняемого в стеке frame"""
+    template = access = None
+    while frame is not None:
+        # type(), а не isinstance(): isinstance вычислил бы ленивые
+        # объекты вроде request.user, выполнив их запросы.
+        obj = frame.f_locals.get('self')
+        kind = type(obj)
+        if access is None and obj is not None:
+            access = lazy_access(kind, obj)
+        if template is None and issubclass(kind, Node):
+            token, source = getattr(obj, 'token', None), obj.origin
+            if token is not None and source is not None:
+                template = f'{source.template_name}:{token.lineno}'
+        line = project_line(frame)
+        if line is not None:
+            return template or line, access
+        frame = frame.f_back
+    return template or '?', access
+
+
+class Repeat:
+    def __init__(self, sql, place, access, count):
+        self.sql = sql
+        self.place = place
+        self.access = access
+        self.count = count
+
+    def __str__(self):
+        what = f'ленивое {self.access}' if self.access else 'запрос'
+        return f'{self.count}× {what} из {self.place}: {self.sql[:300]}'
+
+
+class Detector:
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.calls = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            place, access = origin(sys._getframe(1))
+            self.calls[fingerprint(sql), place, access] += 1
+        return execute(sql, params, many, context)
+
+    def problems(self):
+        return [Repeat(sql, place, access, count)
+                for (sql, place, access), count in self.calls.most_common()
+                if count >= self.threshold]
+
+    def check(self, action='raise', label=''):
+        problems = self.problems()
+        if not problems:
+            return
+        message = '\n'.join([f'N+1 запросы {label}'.rstrip() + ':']
+                            + [f'  {problem}' for problem in problems])
+        if action == 'raise':
+            raise NPlusOneError(message)
+        logger.warning(message)
+
+
+@contextmanager
+def detect(threshold=None, action='raise', label=''):
+    """
+    with detect(): self.client.get(url) — бросает NPlusOneError, если
+    в блоке нашлись N+1 запросы. При исключении в блоке не проверяет.
+    """
+    detector = Detector(threshold)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(detector))
+        yield detector
+    detector.check(action, label)
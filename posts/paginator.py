@@ -0,0 +1,237 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+# id из курсора уходит в SQL параметром: больше BIGINT — OverflowError.
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_id(value):
+    """id из курсора; ValueError, если он не помещается в BIGINT"""
+    value = int(value)
+    if not -MAX_ID - 1 <= value <= MAX_ID:
+        raise ValueError(f'id вне диапазона: {value}')
+    return value
+
+
+class CursorPage(Page):
+    """
+    Страница keyset-пагинации. Номер страницы неизвестен, вместо него
+    есть курсоры на соседние страницы. Запрос выполняется при первом
+    обращении к записям, поэтому закэшированный фрагмент ленты
+    обходится без обращения к БД.
+    """
+    def __init__(self, fetch, paginator):
+        self.number = None
+        self.paginator = paginator
+        self._fetch = fetch
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    @cached_property
+    def _window(self):
+        return self._fetch()
+
+    @property
+    def object_list(self):
+        return self._window[0]
+
+    def has_next(self):
+        return self._window[1]
+
+    def has_previous(self):
+        return self._window[2]
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    @cached_property
+    def next_cursor(self):
+        if not self.has_next() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1])
+
+    @cached_property
+    def previous_cursor(self):
+        if not self.has_previous() or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0],
+                                            backwards=True)
+
+
+class CursorPaginator(Paginator):
+    """
+    Пагинация по ключу (pub_date, id) вместо OFFSET: страница любой
+    глубины читается одним диапазонным запросом LIMIT per_page + 1,
+    без COUNT(*). Ссылки передают непрозрачный курсор ?cursor=...
+
+    Старые ссылки вида ?page=N продолжают работать через обычный
+    Paginator. При approximate_count=True свойство count ограничено
+    count_limit строками, чтобы подсчёт не читал всю таблицу.
+    """
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id'),
+                 approximate_count=False, count_limit=1000, **kwargs):
+        self.ordering = ordering
+        self.approximate_count = approximate_count
+        self.count_limit = count_limit
+        super().__init__(object_list.order_by(*ordering), per_page,
+                         **kwargs)
+
+    @property
+    def keys(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    @property
+    def descending(self):
+        return self.ordering[0].startswith('-')
+
+    @cached_property
+    def count(self):
+        if not self.approximate_count:
+            return super().count
+        return self.object_list.order_by()[:self.count_limit + 1].count()
+
+    @property
+    def count_is_exact(self):
+        return not self.approximate_count or self.count <= self.count_limit
+
+    def encode_cursor(self, obj, backwards=False):
+        date_key, id_key = self.keys
+        payload = [getattr(obj, date_key).isoformat(), getattr(obj, id_key),
+                   int(backwards)]
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (pub_date, id, backwards) или None для мусора"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            date_value, id_value, backwards = json.loads(raw.decode())
+            date_value = parse_datetime(date_value)
+            id_value = parse_id(id_value)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        if date_value is None:
+            return None
+        return date_value, id_value, bool(backwards)
+
+    def cursor_page(self, cursor=None):
+        """Страница после (или до) курсора, первая страница без курсора"""
+        decoded = self.decode_cursor(cursor) if cursor else None
+        return CursorPage(lambda: self.fetch_window(decoded), self)
+
+    def after(self, queryset, date_value, id_value, older):
+        """Записи строго после ключа (date_value, id_value)"""
+        date_key, id_key = self.keys
+        lookup = 'lt' if older else 'gt'
+        return queryset.filter(
+            Q(**{f'{date_key}__{lookup}': date_value})
+            | Q(**{date_key: date_value, f'{id_key}__{lookup}': id_value}))
+
+    def fetch_window(self, decoded):
+        """Возвращает (записи, has_next, has_previous) одним запросом"""
+        if decoded is None:
+            items = list(self.object_list[:self.per_page + 1])
+            return items[:self.per_page], len(items) > self.per_page, False
+
+        date_value, id_value, backwards = decoded
+        # Вперёд по ленте — к более старым записям при убывающем порядке.
+        older = self.descending != backwards
+        queryset = self.after(self.object_list, date_value, id_value, older)
+        if backwards:
+            queryset = queryset.reverse()
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            return items, True, has_more
+        return items, has_more, True
+
+    def forward_queryset(self, cursor=None):
+        """
+        Ленивый QuerySet страницы после курсора — для списков, которые
+        листаются только вперёд («Показать ещё»). Следующий курсор
+        даёт next_cursor_after по уже прочитанным записям.
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self.object_list[:self.per_page]
+        date_value, id_value, _backwards = decoded
+        return self.after(self.object_list, date_value, id_value,
+                          self.descending)[:self.per_page]
+
+    def next_cursor_after(self, items):
+        """Курсор за последней из items или None, если дальше пусто"""
+        items = list(items)
+        if len(items) < self.per_page:
+            return None
+        date_key, id_key = self.keys
+        last = items[-1]
+        if not self.after(self.object_list, getattr(last, date_key),
+                          getattr(last, id_key), self.descending).exists():
+            return None
+        return self.encode_cursor(last)
+
+    def page_from_request(self, request):
+        cursor = request.GET.get(self.cursor_query_param)
+        page_number = request.GET.get(self.page_query_param)
+        if cursor is None and page_number is not None:
+            return self.get_page(page_number)
+        return self.cursor_page(cursor)
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Оценка числа строк таблицы из статистики планировщика без
+    COUNT(*): pg_class.reltuples в PostgreSQL, sqlite_stat1 (после
+    ANALYZE) в SQLite. None, если статистики нет.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class '
+                           'WHERE oid = to_regclass(%s)', [table])
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 '
+                               'WHERE tbl = %s LIMIT 1', [table])
+            except DatabaseError:
+                return None
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    estimate = int(float(str(row[0]).split()[0]))
+    return estimate if estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц в админке: без фильтров число записей
+    берётся из статистики БД, если оно больше ESTIMATED_COUNT_THRESHOLD.
+    Отфильтрованный список и маленькие таблицы считаются точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if (estimate is not None
+                    and estimate > settings.ESTIMATED_COUNT_THRESHOLD):
+                return estimate
+        return super().count
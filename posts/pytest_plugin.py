@@ -0,0 +1,47 @@
+"""
+Поиск N+1 запросов в тестах pytest (posts/nplusone.py).
+
+С фикстурой nplusone каждый запрос тестового клиента проверяется
+отдельно, и N+1 в представлении или шаблоне роняет тест с
+NPlusOneError. Сама фикстура — detect() для проверки любого блока:
+
+    def test_index(client, nplusone):
+        client.get('/')
+        with nplusone():
+            list(Post.objects.all()[0].comments.all())
+
+С флагом --nplusone так проверяется каждый тест набора. Плагин
+подключает conftest.py в корне проекта, поэтому фикстура доступна и в
+tests/, и в posts/tests/. Он же, как TEST_RUNNER для manage.py test,
+подменяет кэш на TEST_CACHES.
+"""
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption('--nplusone', action='store_true',
+                     help='Искать N+1 запросы в каждом тесте')
+
+
+@pytest.fixture
+def nplusone():
+    from django.test import override_settings
+    from posts.nplusone import detect
+
+    with override_settings(NPLUSONE_DETECT='raise'):
+        yield detect
+
+
+@pytest.fixture(autouse=True)
+def nplusone_everywhere(request):
+    if request.config.getoption('nplusone'):
+        request.getfixturevalue('nplusone')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def test_caches():
+    from django.conf import settings
+    from django.test import override_settings
+
+    with override_settings(CACHES=settings.TEST_CACHES):
+        yield
@@ -0,0 +1,91 @@
+"""
+Чтение ленты с реплики.
+
+Представления только для чтения (лента, группа, профиль, пост, API)
+помечены read_replica: их ORM-запросы идут в базу 'replica', если она
+задана в DATABASES. Всё остальное — запись, формы, команды, фоновые
+задачи — работает с основной базой.
+
+Реплика отстаёт от основной базы не больше чем на REPLICA_MAX_LAG
+секунд. Поэтому:
+
+* после запроса, который что-то записал (POST и т. п.), браузер
+  получает cookie, и REPLICA_MAX_LAG секунд его запросы читают с
+  основной базы — автор сразу видит свой пост или комментарий;
+* если области кэша страницы менялись позже REPLICA_MAX_LAG назад,
+  страница и её фрагменты читаются с основной базы, иначе в кэш под
+  новой версией попали бы ещё не доехавшие до реплики данные.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA = 'replica'
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+state = threading.local()
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def reading_replica():
+    return getattr(state, 'replica', False)
+
+
+def use_replica(flag):
+    state.replica = flag
+
+
+@contextmanager
+def replica_reads(flag=True):
+    previous = reading_replica()
+    use_replica(flag)
+    try:
+        yield
+    finally:
+        use_replica(previous)
+
+
+def is_sticky(request):
+    """Пользователь недавно писал и должен читать с основной базы"""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def changed_recently(timestamp):
+    return time.time() - timestamp < settings.REPLICA_MAX_LAG
+
+
+def read_replica(view):
+    """Безопасные запросы к представлению читают с реплики"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        flag = (replica_configured() and request.method in SAFE_METHODS
+                and not is_sticky(request))
+        with replica_reads(flag):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if reading_replica() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема приезжает на реплику вместе с данными.
+        return db == 'default'
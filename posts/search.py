@@ -0,0 +1,270 @@
+"""
+Полнотекстовый поиск по постам.
+
+Индекс живёт рядом с таблицей постов и обновляется сигналами
+posts/signals.py при сохранении и удалении поста:
+
+* SQLite — виртуальная таблица FTS5 posts_post_fts (rowid = id поста),
+  токенизатор unicode61 приводит к нижнему регистру и кириллицу;
+* PostgreSQL — таблица posts_post_search с tsvector в конфигурации
+  SEARCH_CONFIG ('russian', стемминг Snowball) и GIN-индексом.
+
+Буква «ё» приводится к «е» и в индексе, и в запросе. Слова запроса
+ищутся по префиксу, а у русских слов перед этим отрезается окончание,
+поэтому «котами» находит «кот» и «котов». Выдача упорядочена по
+релевансу (меньше — лучше) и id и листается по ключу (score, id).
+Подсветка строится здесь же по исходному тексту поста.
+"""
+import base64
+import json
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .paginator import CursorPage, parse_id
+
+# Окончания русских слов, длинные раньше коротких.
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иях',
+    'ах', 'ях', 'ов', 'ев', 'ей', 'ой', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее',
+    'ие', 'ые', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю', 'ью', 'ия', 'ья',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+MAX_TERMS = 8
+SNIPPET_CHARS = 200
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def normalize(text):
+    """Нижний регистр и «е» вместо «ё»; длина строки не меняется"""
+    return text.lower().replace('ё', 'е')
+
+
+def stem(word):
+    if not CYRILLIC_RE.search(word):
+        return word
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def query_terms(query):
+    """Префиксы слов запроса; только \\w, поэтому безопасны в MATCH"""
+    terms = []
+    for word in WORD_RE.findall(normalize(query)):
+        term = stem(word)
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def index_post(post):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute('INSERT INTO posts_post_fts (rowid, text) '
+                           'VALUES (%s, %s)', [post.pk, normalize(post.text)])
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO posts_post_search (post_id, document) '
+                'VALUES (%s, to_tsvector(%s::regconfig, %s)) '
+                'ON CONFLICT (post_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                [post.pk, settings.SEARCH_CONFIG, normalize(post.text)])
+
+
+def index_posts(rows):
+    """
+    Индексирует пачку (id, text) постов, созданных bulk_create в обход
+    сигналов: по одному executemany на пачку вместо двух запросов на пост
+    """
+    rows = [(post_id, normalize(text)) for post_id, text in rows]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM posts_post_fts WHERE rowid = %s',
+                               [(post_id,) for post_id, _ in rows])
+            cursor.executemany('INSERT INTO posts_post_fts (rowid, text) '
+                               'VALUES (%s, %s)', rows)
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO posts_post_search (post_id, document) '
+                'VALUES (%s, to_tsvector(%s::regconfig, %s)) '
+                'ON CONFLICT (post_id) DO UPDATE '
+                'SET document = EXCLUDED.document',
+                [(post_id, settings.SEARCH_CONFIG, text)
+                 for post_id, text in rows])
+
+
+def remove_post(post_id):
+    # В PostgreSQL строку индекса удаляет ON DELETE CASCADE.
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts WHERE rowid = %s',
+                           [post_id])
+
+
+def sqlite_search(terms, filters, after, backwards, limit):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    sql = ['SELECT p.id, bm25(posts_post_fts) FROM posts_post_fts '
+           'JOIN posts_post p ON p.id = posts_post_fts.rowid '
+           'WHERE posts_post_fts MATCH %s']
+    params = [match]
+    return run_search(sql, params, 'bm25(posts_post_fts)', filters, after,
+                      backwards, limit)
+
+
+def postgresql_search(terms, filters, after, backwards, limit):
+    tsquery = ' & '.join(f'{term}:*' for term in terms)
+    score = '(-ts_rank(s.document, q))::float8'
+    sql = ['SELECT p.id, ' + score + ' FROM posts_post_search s '
+           'JOIN posts_post p ON p.id = s.post_id, '
+           'to_tsquery(%s::regconfig, %s) q WHERE s.document @@ q']
+    params = [settings.SEARCH_CONFIG, tsquery]
+    return run_search(sql, params, score, filters, after, backwards, limit)
+
+
+def run_search(sql, params, score, filters, after, backwards, limit):
+    for column, value in filters.items():
+        sql.append(f'AND p.{column} = %s')
+        params.append(value)
+    if after is not None:
+        op = '<' if backwards else '>'
+        sql.append(f'AND ({score} {op} %s '
+                   f'OR ({score} = %s AND p.id {op} %s))')
+        params += [after[0], after[0], after[1]]
+    direction = 'DESC' if backwards else 'ASC'
+    sql.append(f'ORDER BY {score} {direction}, p.id {direction} LIMIT %s')
+    params.append(limit)
+    # Та же база, из которой in_bulk потом прочитает посты.
+    with connections[router.db_for_read(Post)].cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return cursor.fetchall()
+
+
+def filter_posts(queryset, query):
+    """
+    Сужает queryset постов до найденных индексом (без ранжирования),
+    например для поиска в админке. Без индекса — обычный icontains.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    if connection.vendor == 'sqlite':
+        return queryset.filter(pk__in=RawSQL(
+            'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+            [' '.join(f'"{term}"*' for term in terms)]))
+    if connection.vendor == 'postgresql':
+        return queryset.filter(pk__in=RawSQL(
+            'SELECT post_id FROM posts_post_search '
+            'WHERE document @@ to_tsquery(%s::regconfig, %s)',
+            [settings.SEARCH_CONFIG,
+             ' & '.join(f'{term}:*' for term in terms)]))
+    return queryset.filter(text__icontains=query)
+
+
+BACKENDS = {
+    'sqlite': sqlite_search,
+    'postgresql': postgresql_search,
+}
+
+
+def highlight(text, terms):
+    """
+    Фрагмент текста вокруг первого совпадения, совпадения обёрнуты в
+    <mark>. Текст экранируется, результат безопасен для шаблона.
+    """
+    pattern = re.compile(
+        r'\b(?:' + '|'.join(map(re.escape, terms)) + r')\w*')
+    matches = list(pattern.finditer(normalize(text)))
+    start = 0
+    if matches and len(text) > SNIPPET_CHARS:
+        start = max(0, matches[0].start() - SNIPPET_CHARS // 4)
+    end = start + SNIPPET_CHARS
+    parts = ['…'] if start else []
+    position = start
+    for match in matches:
+        if match.start() >= end:
+            break
+        parts.append(escape(text[position:match.start()]))
+        parts.append(f'<mark>{escape(text[match.start():match.end()])}'
+                     '</mark>')
+        position = match.end()
+    parts.append(escape(text[position:end]))
+    if end < len(text):
+        parts.append('…')
+    return mark_safe(''.join(parts))
+
+
+class SearchPaginator:
+    """
+    Keyset-пагинация выдачи по (score, id) с тем же интерфейсом курсоров,
+    что у CursorPaginator, поэтому подходит include/cursor_paginator.html.
+    """
+    cursor_query_param = 'cursor'
+    approximate_count = False
+
+    def __init__(self, query, per_page, group=None, author=None):
+        self.terms = query_terms(query)
+        self.per_page = per_page
+        self.filters = {}
+        if group is not None:
+            self.filters['group_id'] = group.pk
+        if author is not None:
+            self.filters['author_id'] = author.pk
+
+    def encode_cursor(self, post, backwards=False):
+        raw = json.dumps([post.score, post.pk, int(backwards)],
+                         separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает ((score, id), backwards) или None для мусора"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            score, post_id, backwards = json.loads(raw.decode())
+            return (float(score), parse_id(post_id)), bool(backwards)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+
+    def cursor_page(self, cursor=None):
+        decoded = self.decode_cursor(cursor) if cursor else None
+        return CursorPage(lambda: self.fetch_window(decoded), self)
+
+    def page_from_request(self, request):
+        return self.cursor_page(request.GET.get(self.cursor_query_param))
+
+    def fetch_window(self, decoded):
+        """Возвращает (посты, has_next, has_previous)"""
+        search = BACKENDS.get(connection.vendor)
+        if not self.terms or search is None:
+            return [], False, False
+        after, backwards = decoded or (None, False)
+        rows = search(self.terms, self.filters, after, backwards,
+                      self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in rows])
+        items = []
+        for pk, score in rows:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.score = score
+            post.snippet = highlight(post.text, self.terms)
+            items.append(post)
+        if backwards:
+            return items, True, has_more
+        return items, has_more, after is not None
@@ -0,0 +1,112 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from users.models import Profile
+from . import cache, feed, search, thumbnails
+from .models import Group, Post, Comment, Follow
+
+
+def bump_profile(user_id, field, delta):
+    """Сдвигает счётчик профиля на delta одним UPDATE без чтения."""
+    if user_id is None:
+        return
+    profiles = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        profiles = profiles.filter(**{f'{field}__gte': -delta})
+    updated = profiles.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        # Профиля ещё нет (например, пользователь создан до миграции):
+        # заводим его, точные значения восстановит repair_counters.
+        Profile.objects.get_or_create(user_id=user_id,
+                                      defaults={field: delta})
+
+
+def bump_post_caches(group_id, author_id, *extra_group_ids):
+    """Сбрасывает фрагменты лент, в которых виден пост"""
+    scopes = ['posts', f'author:{author_id}']
+    scopes += [f'group:{pk}' for pk in {group_id, *extra_group_ids}
+               if pk is not None]
+    cache.bump(*scopes)
+
+
+def bump_follow_caches(user_id, author_id):
+    """Лента подписок читателя и счётчики подписок обоих профилей"""
+    cache.bump(f'follow:{user_id}', f'profile:{user_id}',
+               f'profile:{author_id}')
+
+
+def bump_comment_caches(post_id):
+    scopes = (Post.objects.filter(pk=post_id)
+              .values_list('group_id', 'author_id').first())
+    if scopes is not None:
+        bump_post_caches(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if created and not raw:
+        bump_profile(instance.author_id, 'post_count', 1)
+        feed.fan_out_post(instance)
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+    bump_post_caches(instance.group_id, instance.author_id,
+                     getattr(instance, '_loaded_group_id', None))
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_profile(instance.author_id, 'post_count', -1)
+    search.remove_post(instance.pk)
+    bump_post_caches(instance.group_id, instance.author_id)
+    variants = instance.variant_sources()
+    if variants:
+        # Файлы удаляются только после коммита: откат удаления оставил
+        # бы пост без вариантов.
+        storage = instance.image.storage
+        transaction.on_commit(
+            lambda: thumbnails.delete_files(storage, variants))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1)
+    bump_comment_caches(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1)
+    bump_comment_caches(instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cache.bump('groups', f'group:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        with transaction.atomic():
+            bump_profile(instance.author_id, 'follower_count', 1)
+            bump_profile(instance.user_id, 'following_count', 1)
+        feed.backfill(instance.user_id, instance.author_id)
+    bump_follow_caches(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    with transaction.atomic():
+        bump_profile(instance.author_id, 'follower_count', -1)
+        bump_profile(instance.user_id, 'following_count', -1)
+    feed.trim(instance.user_id, instance.author_id)
+    feed.follower_left(instance.author_id)
+    bump_follow_caches(instance.user_id, instance.author_id)
@@ -0,0 +1,32 @@
+"""
+Настройка каждого нового соединения SQLite.
+
+По умолчанию SQLite работает с журналом отката: пишущая транзакция
+блокирует и читателей, а каждый коммит делает fsync. В режиме WAL
+читатели не ждут писателя, а synchronous=NORMAL синхронизирует диск
+только на контрольных точках WAL. Последние транзакции могут потеряться
+при отключении питания, но не при падении процесса. mmap_size и
+cache_size держат горячие страницы в памяти, temp_store=MEMORY
+убирает временные файлы сортировок, busy_timeout заставляет ждать
+блокировку вместо немедленного «database is locked».
+
+Значения берутся из SQLITE_PRAGMAS при открытии соединения. Вместе с
+CONN_MAX_AGE соединение и его настройки переиспользуются между
+запросами.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
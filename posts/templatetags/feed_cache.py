@@ -0,0 +1,80 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import metrics
+from posts.cache import (EDIT_BUTTON_MARKER, author_button, card_key,
+                         personalize, scope_versions)
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, fragment):
+        self.nodelist = nodelist
+        self.fragment = fragment
+
+    def render(self, context):
+        fragment = self.fragment.resolve(context)
+        if fragment is None:
+            return self.nodelist.render(context)
+        with context.push(shared_fragment=fragment.shared):
+            html = fragment.get_or_render(
+                lambda: self.nodelist.render(context))
+        if not fragment.shared:
+            return html
+        user = context.get('user')
+        return mark_safe(personalize(html, getattr(user, 'pk', None)))
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """
+    {% cachedfragment fragment %} ... {% endcachedfragment %}
+
+    fragment — объект posts.cache.Fragment из контекста представления.
+    """
+    bits = token.split_contents()
+    if len(bits) != 2:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает один аргумент: объект Fragment')
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, parser.compile_filter(bits[1]))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """
+    Карточка поста из общего кэша. Кнопка «Редактировать» зависит от
+    пользователя, поэтому в кэше вместо неё метка, которая заменяется
+    кнопкой только для автора поста.
+    """
+    request = context.get('request')
+    groups_version = getattr(request, '_groups_version', None)
+    if groups_version is None:
+        groups_version, = scope_versions(('groups',))
+        if request is not None:
+            request._groups_version = groups_version
+
+    key = card_key(post, groups_version)
+    html = cache.get(key)
+    metrics.count_cache('card', html is not None)
+    if html is None:
+        html = render_to_string('include/post_card.html', {'post': post})
+        cache.set(key, html, settings.FEED_CACHE_TIMEOUT)
+
+    # В общем фрагменте кнопка есть у каждой карточки, и
+    # FragmentNode оставляет её только автору.
+    shared = context.get('shared_fragment', False)
+    user = context.get('user')
+    if shared or (user is not None and user.pk is not None
+                  and user.pk == post.author_id):
+        button = render_to_string('include/post_edit_button.html',
+                                  {'post': post})
+        if shared:
+            button = author_button(post.author_id, button)
+        html = html.replace(EDIT_BUTTON_MARKER, button)
+    return mark_safe(html)
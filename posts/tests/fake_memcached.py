@@ -0,0 +1,142 @@
+"""
+Минимальный memcached-сервер в потоке тестового процесса.
+
+Понимает текстовый протокол в объёме, который использует
+python-memcached через MemcachedCache: get/gets, set/add/replace,
+delete, incr/decr, touch, flush_all, version. Нужен, чтобы проверять
+общий для нескольких процессов кэш без внешних сервисов.
+"""
+import socketserver
+import threading
+import time
+
+THIRTY_DAYS = 60 * 60 * 24 * 30
+
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().split()
+            if not parts:
+                continue
+            command, args = parts[0], parts[1:]
+            noreply = bool(args) and args[-1] == 'noreply'
+            if noreply:
+                args = args[:-1]
+            method = getattr(self, f'do_{command}', None)
+            if method is None:
+                self.reply('ERROR', False)
+                continue
+            with self.server.lock:
+                response = method(*args)
+            self.reply(response, noreply)
+
+    def reply(self, response, noreply):
+        if noreply:
+            return
+        if isinstance(response, str):
+            response = response.encode() + b'\r\n'
+        self.wfile.write(response)
+
+    def item(self, key):
+        item = self.server.data.get(key)
+        if item is not None and item[2] and item[2] < time.time():
+            del self.server.data[key]
+            return None
+        return item
+
+    def store(self, key, flags, exptime, size, condition):
+        value = self.rfile.read(int(size) + 2)[:-2]
+        exptime = int(exptime)
+        if 0 < exptime <= THIRTY_DAYS:
+            exptime += time.time()
+        elif exptime < 0:
+            exptime = time.time() - 1
+        if not condition(self.item(key)):
+            return 'NOT_STORED'
+        self.server.data[key] = (int(flags), value, exptime)
+        return 'STORED'
+
+    def do_get(self, *keys):
+        out = b''
+        for key in keys:
+            item = self.item(key)
+            if item is not None:
+                flags, value, _ = item
+                out += f'VALUE {key} {flags} {len(value)}\r\n'.encode()
+                out += value + b'\r\n'
+        return out + b'END\r\n'
+
+    do_gets = do_get
+
+    def do_set(self, key, flags, exptime, size):
+        return self.store(key, flags, exptime, size, lambda item: True)
+
+    def do_add(self, key, flags, exptime, size):
+        return self.store(key, flags, exptime, size,
+                          lambda item: item is None)
+
+    def do_replace(self, key, flags, exptime, size):
+        return self.store(key, flags, exptime, size,
+                          lambda item: item is not None)
+
+    def do_delete(self, key, *args):
+        if self.item(key) is None:
+            return 'NOT_FOUND'
+        del self.server.data[key]
+        return 'DELETED'
+
+    def change(self, key, delta):
+        item = self.item(key)
+        if item is None:
+            return 'NOT_FOUND'
+        flags, value, exptime = item
+        value = max(int(value) + delta, 0)
+        self.server.data[key] = (flags, str(value).encode(), exptime)
+        return str(value)
+
+    def do_incr(self, key, delta):
+        return self.change(key, int(delta))
+
+    def do_decr(self, key, delta):
+        return self.change(key, -int(delta))
+
+    def do_touch(self, key, exptime):
+        item = self.item(key)
+        if item is None:
+            return 'NOT_FOUND'
+        self.server.data[key] = item[:2] + (time.time() + int(exptime),)
+        return 'TOUCHED'
+
+    def do_flush_all(self, *args):
+        self.server.data.clear()
+        return 'OK'
+
+    def do_version(self):
+        return 'VERSION fake-1.0'
+
+
+class FakeMemcachedServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), MemcachedHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    @property
+    def location(self):
+        host, port = self.server_address
+        return f'{host}:{port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginator import EstimatedCountPaginator
+
+User = get_user_model()
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Группа')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        for number in range(count):
+            post = Post.objects.create(text=f'Пост {number}',
+                                       author=self.author, group=self.group)
+            Comment.objects.create(post=post, author=self.author,
+                                   text=f'Комментарий {number}')
+
+    def queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_changelists_do_not_grow_with_rows(self):
+        """Число запросов списков не зависит от числа строк"""
+        urls = [reverse(f'admin:posts_{model}_changelist')
+                for model in ('post', 'comment', 'follow')]
+        self.create_rows(2)
+        Follow.objects.create(user=self.admin, author=self.author)
+        before = [len(self.queries(url)) for url in urls]
+        self.create_rows(20)
+        Follow.objects.create(user=self.author, author=self.admin)
+        self.assertEqual([len(self.queries(url)) for url in urls], before)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=5)
+    def test_estimated_count_without_filters(self):
+        """Без фильтров список не делает COUNT(*) по всей таблице"""
+        self.create_rows(10)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.create_rows(3)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 5)
+        self.assertEqual(paginator.count, 10)
+        filtered = EstimatedCountPaginator(
+            Post.objects.filter(author=self.author), 5)
+        self.assertEqual(filtered.count, 13)
+
+        sql = self.queries(reverse('admin:posts_post_changelist'))
+        self.assertFalse([query for query in sql
+                          if 'COUNT(*)' in query and 'WHERE' not in query])
+
+    def test_search_uses_index(self):
+        """Поиск в списке постов идёт по полнотекстовому индексу"""
+        Post.objects.create(text='Кошки любят рыбу', author=self.author)
+        Post.objects.create(text='Собаки любят кости', author=self.author)
+        url = reverse('admin:posts_post_changelist')
+        sql = self.queries(url, q='кошками')
+        self.assertTrue([query for query in sql if 'MATCH' in query])
+        response = self.client.get(url, {'q': 'кошками'})
+        self.assertContains(response, 'Кошки любят рыбу')
+        self.assertNotContains(response, 'Собаки любят кости')
+
+    def test_comment_search_by_text_and_author(self):
+        """Комментарии ищутся и по тексту, и по имени автора"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Comment.objects.create(post=post, author=self.author,
+                               text='Отличная статья')
+        Comment.objects.create(post=post, author=self.admin,
+                               text='Спасибо')
+        url = reverse('admin:posts_comment_changelist')
+        response = self.client.get(url, {'q': 'статья'})
+        self.assertContains(response, 'Отличная статья')
+        self.assertNotContains(response, 'Спасибо')
+        response = self.client.get(url, {'q': 'admin'})
+        self.assertContains(response, 'Спасибо')
+        self.assertNotContains(response, 'Отличная статья')
+
+    def test_edit_form_uses_autocomplete(self):
+        """Автор и группа выбираются автодополнением, а не <select>"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=[post.pk]))
+        self.assertContains(response, 'data-ajax--url', count=2)
@@ -0,0 +1,151 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.feed import backfill_followers
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Группа')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_endpoints(self):
+        """Все ресурсы отдают компактный JSON"""
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        urls = {
+            reverse('api:posts'): 'results',
+            reverse('api:group', args=['group']): 'results',
+            reverse('api:profile', args=['writer']): 'post_count',
+            reverse('api:profile_posts', args=['writer']): 'results',
+            reverse('api:post', args=['writer', self.post.pk]): 'comments',
+        }
+        for url, key in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(key, response.json())
+                self.assertNotIn(b', ', response.content)
+        detail = self.client.get(
+            reverse('api:post', args=['writer', self.post.pk])).json()
+        self.assertEqual(detail['text'], 'Первый пост')
+        self.assertEqual(detail['group'], 'group')
+        self.assertEqual(detail['comments'][0]['text'], 'Комментарий')
+
+    def test_cursor_pages(self):
+        """Списки листаются курсором из ссылки next"""
+        for number in range(25):
+            Post.objects.create(text=f'Пост {number}', author=self.author)
+        first = self.client.get(reverse('api:posts')).json()
+        self.assertEqual(len(first['results']), 20)
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 6)
+        self.assertIsNone(second['next'])
+
+    def test_comment_pages(self):
+        """Комментарии поста листаются ссылками comments_next и next"""
+        for number in range(25):
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text=f'Комментарий {number}')
+        detail = self.client.get(
+            reverse('api:post', args=['writer', self.post.pk])).json()
+        self.assertEqual(len(detail['comments']), 20)
+        self.assertEqual(detail['comments'][0]['text'], 'Комментарий 24')
+        rest = self.client.get(detail['comments_next']).json()
+        self.assertEqual([comment['text'] for comment in rest['results']],
+                         [f'Комментарий {number}'
+                          for number in range(4, -1, -1)])
+        self.assertIsNone(rest['next'])
+
+    def test_not_modified_before_queries(self):
+        """Совпавший ETag даёт 304 без запросов к БД"""
+        url = reverse('api:posts')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(context.captured_queries, [])
+
+    def test_etag_changes_with_data(self):
+        """Новый пост, комментарий или правка меняют ETag"""
+        urls = (reverse('api:posts'),
+                reverse('api:post', args=['writer', self.post.pk]))
+        changes = (
+            lambda: Post.objects.create(text='Ещё', author=self.author),
+            lambda: Comment.objects.create(post=self.post,
+                                           author=self.reader, text='Да'),
+        )
+        for change in changes:
+            etags = [self.client.get(url)['ETag'] for url in urls]
+            change()
+            for url, etag in zip(urls, etags):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_profile_etag_follows_subscriptions(self):
+        """Подписка меняет счётчики профиля и его ETag"""
+        url = reverse('api:profile', args=['writer'])
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['follower_count'], 1)
+
+    def test_follow_feed(self):
+        """Лента подписок только для вошедших и меняется с подпиской"""
+        url = reverse('api:follow')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.json()['results'][0]['id'], self.post.pk)
+
+    def test_follow_feed_cursor(self):
+        """Лента подписок листается курсором без COUNT, и у знаменитостей"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.bulk_create([Post(text=f'Пост {number}',
+                                       author=self.author)
+                                  for number in range(20)])
+        ids = list(Post.objects.order_by('-pub_date', '-id')
+                   .values_list('id', flat=True))
+        self.client.force_login(self.reader)
+        for limit in (1000, 0):
+            with self.subTest(limit=limit), \
+                    self.settings(FEED_FANOUT_LIMIT=limit):
+                backfill_followers(self.author.pk)
+                with CaptureQueriesContext(connection) as context:
+                    first = self.client.get(reverse('api:follow')).json()
+                self.assertFalse([query for query in context.captured_queries
+                                  if 'COUNT(' in query['sql']])
+                second = self.client.get(first['next']).json()
+                self.assertIsNone(second['next'])
+                self.assertEqual([post['id'] for post in first['results']
+                                  + second['results']], ids)
+                previous = self.client.get(second['previous']).json()
+                self.assertEqual(previous['results'], first['results'])
+
+    def test_unknown_objects(self):
+        """Неизвестные группа, автор и пост дают 404"""
+        for url in (reverse('api:group', args=['nope']),
+                    reverse('api:profile', args=['nobody']),
+                    reverse('api:post', args=['reader', self.post.pk])):
+            self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import urls
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from posts.management.commands.seed_bench import USER_PREFIX
+from users.models import Profile
+
+
+def seed(**options):
+    options = {'users': 30, 'groups': 3, 'posts': 200, 'comments': 300,
+               'follows': 4, 'batch_size': 50, **options}
+    call_command('seed_bench', stdout=StringIO(), **options)
+
+
+class SeedBenchTests(TestCase):
+    """Синтетические данные для нагрузочных тестов"""
+
+    def test_rows_and_derived_data(self):
+        """Строки созданы, счётчики, индекс и ленты восстановлены"""
+        seed()
+        self.assertEqual(Profile.objects.filter(
+            user__username__startswith=USER_PREFIX).count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        out = StringIO()
+        call_command('repair_counters', dry_run=True, stdout=out)
+        self.assertNotIn(
+            'расхождений 1', out.getvalue().replace('расхождений 0', ''))
+
+        dates = list(Post.objects.order_by('pk')
+                     .values_list('pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertLess(dates[0], dates[-1])
+        response = Client().get(reverse('search'), {'q': 'город'})
+        self.assertTrue(response.context['page'].object_list)
+
+    def test_repeatable(self):
+        """Одинаковый seed — одинаковые данные"""
+        seed()
+        first = list(Post.objects.order_by('pk')
+                     .values_list('text', 'author__username'))
+        seed(flush=True)
+        second = list(Post.objects.order_by('pk')
+                      .values_list('text', 'author__username'))
+        self.assertEqual(first, second)
+
+    def test_refuses_to_seed_twice(self):
+        seed()
+        with self.assertRaises(CommandError):
+            seed()
+
+
+class BenchUrlsTests(TestCase):
+    """Замер всех адресов posts/urls.py с сохранением в JSON"""
+
+    def test_results_for_every_url(self):
+        seed()
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command('bench_urls', repeat=2, warmup=1, output=output,
+                         stdout=StringIO())
+            out = StringIO()
+            call_command('bench_urls', repeat=2, warmup=0, output=output,
+                         compare=output, stdout=out)
+            with open(output, encoding='utf-8') as file:
+                result = json.load(file)
+
+        self.assertEqual(set(result['urls']),
+                         {pattern.name for pattern in urls.urlpatterns})
+        for name, stats in result['urls'].items():
+            with self.subTest(name=name):
+                self.assertLess(stats['status'], 500)
+                self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertGreater(result['urls']['index']['queries'], 0)
+        self.assertEqual(result['rows']['posts'], 200)
+        self.assertIn('%)', out.getvalue())
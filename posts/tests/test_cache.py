@@ -0,0 +1,199 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import (TestCase, TransactionTestCase, Client,
+                         RequestFactory)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.cache import Fragment, bump, scope_versions
+from posts.models import Group, Post, Comment, Follow
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.group = Group.objects.create(
+            title='Лев Толстой',
+            slug='tolstoy',
+            description='Группа Льва Толстого',
+        )
+        cls.author = User.objects.create_user(username='authorForPosts')
+        cls.reader = User.objects.create_user(username='TonyStark')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        self.post = Post.objects.create(text='Первый пост',
+                                        author=self.author, group=self.group)
+
+    def test_cached_index_skips_feed_query(self):
+        """Повторная главная страница не читает посты из БД"""
+        self.guest_client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(reverse('index'))
+        self.assertContains(response, 'Первый пост')
+        self.assertFalse([query for query in context.captured_queries
+                          if 'posts_post' in query['sql']])
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост сразу виден на главной, в группе и в профиле"""
+        urls = (
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(text='Второй пост', author=self.author,
+                            group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Второй пост')
+
+    def test_comment_invalidates_index(self):
+        """Новый комментарий обновляет счётчик в карточке"""
+        self.guest_client.get(reverse('index'))
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Отличная статья!')
+        self.assertContains(self.guest_client.get(reverse('index')),
+                            'Комментариев: 1')
+
+    def test_follow_feed_is_per_user(self):
+        """Лента подписок не совпадает с главной страницей"""
+        self.authorized_client.get(reverse('index'))
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertNotContains(response, 'Первый пост')
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertContains(response, 'Первый пост')
+
+    def test_public_feed_shared_across_users(self):
+        """Ключ главной не зависит от пользователя, ленты подписок — да"""
+        request = RequestFactory().get(reverse('index'))
+        keys = {}
+        for user in (self.author, self.reader, AnonymousUser()):
+            request.user = user
+            keys[user.pk] = (
+                Fragment.for_request(request, 'index').base_key(),
+                Fragment.for_request(request, 'follow',
+                                     per_user=True).base_key(),
+            )
+        self.assertEqual(len({index for index, _ in keys.values()}), 1)
+        self.assertEqual(len({follow for _, follow in keys.values()}), 3)
+
+    def test_shared_feed_edit_button_only_for_author(self):
+        """Общая главная показывает «Редактировать» только автору"""
+        edit_url = reverse('post_edit', args=[self.author.username,
+                                              self.post.id])
+        author_client = Client()
+        author_client.force_login(self.author)
+        for first, second in ((author_client, self.authorized_client),
+                              (self.authorized_client, author_client)):
+            with self.subTest(first=first):
+                cache.clear()
+                first.get(reverse('index'))
+                self.assertNotContains(
+                    self.authorized_client.get(reverse('index')), edit_url)
+                self.assertContains(author_client.get(reverse('index')),
+                                    edit_url)
+                self.assertNotContains(second.get(reverse('index')),
+                                       'edit-button')
+
+    def test_stale_fragment_served_while_locked(self):
+        """Пока фрагмент пересчитывает другой процесс, отдаётся прошлый"""
+        fragment = Fragment('test', scopes=('test',))
+        self.assertEqual(fragment.get_or_render(lambda: 'старый'), 'старый')
+        bump('test')
+        cache.add(fragment.base_key() + ':lock', 1)
+        self.assertEqual(fragment.get_or_render(lambda: 'новый'), 'старый')
+        cache.delete(fragment.base_key() + ':lock')
+        self.assertEqual(fragment.get_or_render(lambda: 'новый'), 'новый')
+
+    def test_foreign_lock_kept_without_stale_copy(self):
+        """Промах без прошлой версии не снимает чужую блокировку"""
+        fragment = Fragment('test', scopes=('test',))
+        lock_key = fragment.base_key() + ':lock'
+        cache.add(lock_key, 1)
+        self.assertEqual(fragment.get_or_render(lambda: 'новый'), 'новый')
+        self.assertIsNotNone(cache.get(lock_key))
+
+
+class CommitBumpTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='authorForPosts')
+
+    def test_versions_bumped_again_after_commit(self):
+        """Фрагмент, сохранённый до коммита, после коммита не читается"""
+        with transaction.atomic():
+            Post.objects.create(text='Первый пост', author=self.author)
+            inside = scope_versions(('posts',))
+            fragment = Fragment('test', scopes=('posts',))
+            fragment.get_or_render(lambda: 'до коммита')
+        self.assertNotEqual(scope_versions(('posts',)), inside)
+        self.assertEqual(fragment.get_or_render(lambda: 'после коммита'),
+                         'после коммита')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.group = Group.objects.create(
+            title='Лев Толстой',
+            slug='tolstoy',
+            description='Группа Льва Толстого',
+        )
+        cls.author = User.objects.create_user(username='authorForPosts')
+        cls.reader = User.objects.create_user(username='TonyStark')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.post = Post.objects.create(text='Первый пост',
+                                        author=self.author, group=self.group)
+        self.post_url = reverse('post', args=[self.author.username,
+                                              self.post.id])
+
+    def test_edit_button_only_for_author(self):
+        """Общая карточка показывает «Редактировать» только автору"""
+        edit_url = reverse('post_edit', args=[self.author.username,
+                                              self.post.id])
+        self.assertContains(self.author_client.get(self.post_url), edit_url)
+        self.assertNotContains(self.reader_client.get(self.post_url),
+                               edit_url)
+
+    def test_card_invalidated_by_edit_comment_and_group(self):
+        """Карточка обновляется после правки, комментария и смены группы"""
+        self.reader_client.get(self.post_url)
+        self.author_client.post(
+            reverse('post_edit', args=[self.author.username, self.post.id]),
+            {'text': 'Исправленный пост', 'group': self.group.id})
+        self.assertContains(self.reader_client.get(self.post_url),
+                            'Исправленный пост')
+
+        self.reader_client.post(
+            reverse('add_comment', args=[self.author.username,
+                                         self.post.id]),
+            {'text': 'Отличная статья!'})
+        self.assertContains(self.reader_client.get(self.post_url),
+                            'Комментариев: 1')
+
+        self.group.title = 'Фёдор Достоевский'
+        self.group.save()
+        self.assertContains(self.reader_client.get(self.post_url),
+                            '#Фёдор Достоевский')
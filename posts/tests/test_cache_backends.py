@@ -0,0 +1,114 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from posts.cache import Fragment, bump, scope_versions
+from posts.tests.fake_memcached import FakeMemcachedServer
+from posts.tests import test_cache
+
+WORKER = '''
+import django
+django.setup()
+from posts.cache import Fragment, bump
+bump('shared')
+Fragment('shared', scopes=('shared',)).get_or_render(lambda: 'из воркера')
+'''
+
+
+def run_worker(backend, location):
+    """Выполняет WORKER в отдельном процессе с тем же кэшем"""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='yatube.settings',
+               CACHE_BACKEND=backend, CACHE_LOCATION=location)
+    subprocess.run([sys.executable, '-c', WORKER], env=env,
+                   cwd=settings.BASE_DIR, check=True)
+
+
+class SharedCacheMixin:
+    """
+    Подменяет кэш на общий для процессов бэкенд на время класса. По
+    умолчанию — файловый кэш во временном каталоге
+    """
+    backend = 'file'
+
+    @classmethod
+    def start_backend(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        return cls.cache_dir
+
+    @classmethod
+    def stop_backend(cls):
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.location = cls.start_backend()
+        cls.cache_override = override_settings(CACHES={'default': {
+            'BACKEND': settings.CACHE_BACKENDS[cls.backend][0],
+            'LOCATION': cls.location,
+            'KEY_PREFIX': settings.CACHES['default']['KEY_PREFIX'],
+        }})
+        cls.cache_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache_override.disable()
+        cls.stop_backend()
+
+
+class CrossProcessMixin:
+    def test_version_bump_crosses_processes(self):
+        """Сброс версии в одном процессе виден в другом"""
+        before = scope_versions(('shared',))
+        run_worker(self.backend, self.location)
+        self.assertNotEqual(scope_versions(('shared',)), before)
+
+    def test_fragment_rendered_once_for_all_workers(self):
+        """Фрагмент, отрисованный воркером, читается без рендера"""
+        run_worker(self.backend, self.location)
+        fragment = Fragment('shared', scopes=('shared',))
+        self.assertEqual(fragment.get_or_render(lambda: 'заново'),
+                         'из воркера')
+        bump('shared')
+        self.assertEqual(fragment.get_or_render(lambda: 'заново'),
+                         'заново')
+
+
+class MemcachedMixin(SharedCacheMixin):
+    backend = 'memcached'
+
+    @classmethod
+    def start_backend(cls):
+        cls.server = FakeMemcachedServer().__enter__()
+        return cls.server.location
+
+    @classmethod
+    def stop_backend(cls):
+        cls.server.__exit__(None, None, None)
+
+
+class FileCacheTests(SharedCacheMixin, CrossProcessMixin, TestCase):
+    pass
+
+
+class FileFeedCacheTests(SharedCacheMixin, test_cache.FeedCacheTests):
+    pass
+
+
+class MemcachedTests(MemcachedMixin, CrossProcessMixin, TestCase):
+    pass
+
+
+class MemcachedFeedCacheTests(MemcachedMixin, test_cache.FeedCacheTests):
+    pass
+
+
+class MemcachedCardCacheTests(MemcachedMixin,
+                              test_cache.PostCardCacheTests):
+    pass
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Группа')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.user = Client()
+        self.user.force_login(self.reader)
+        self.urls = (
+            reverse('index'),
+            reverse('group', args=['group']),
+            reverse('profile', args=['writer']),
+            reverse('post', args=['writer', self.post.pk]),
+        )
+
+    def test_anonymous_pages_are_public(self):
+        """Анонимные страницы отдаются с ETag для общего кэша"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertIn('public', response['Cache-Control'])
+                self.assertNotIn('Cookie', response.get('Vary', ''))
+
+    def test_repeated_request_skips_rendering(self):
+        """Повтор с If-None-Match — 304 без шаблона и запросов ленты"""
+        # Группе и автору нужен только поиск id по уникальному полю.
+        expected_queries = (0, 1, 1, 1)
+        for url, expected in zip(self.urls, expected_queries):
+            with self.subTest(url=url):
+                etag = self.guest.get(url)['ETag']
+                with CaptureQueriesContext(connection) as context:
+                    response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+                self.assertEqual(len(context.captured_queries), expected)
+
+    def test_logged_in_pages_are_private(self):
+        """Вошедшему пользователю — private и Vary: Cookie, без ETag"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.user.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_changes_invalidate(self):
+        """Пост, комментарий и подписка меняют ETag своих страниц"""
+        changes = (
+            (self.urls[0],
+             lambda: Post.objects.create(text='Новый', author=self.author)),
+            (self.urls[3],
+             lambda: Comment.objects.create(post=self.post,
+                                            author=self.reader, text='Да')),
+            (self.urls[2],
+             lambda: Follow.objects.create(user=self.reader,
+                                           author=self.author)),
+        )
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.guest.get(url)['ETag']
+                change()
+                response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_unknown_author_is_404(self):
+        """Проверка ETag не скрывает 404 для неизвестного автора"""
+        response = self.guest.get(reverse('profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,83 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Post, Comment, Follow
+from users.models import Profile
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='authorForPosts')
+        cls.reader = User.objects.create_user(username='TonyStark')
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_profile_created_with_user(self):
+        """Профиль со счётчиками создаётся вместе с пользователем"""
+        self.assertEqual(self.profile(self.author).post_count, 0)
+
+    def test_post_and_comment_counters(self):
+        """Создание и удаление постов и комментариев меняет счётчики"""
+        post = Post.objects.create(text='Какой-то там текст',
+                                   author=self.author)
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Отличная статья!')
+        post.refresh_from_db()
+        self.assertEqual(self.profile(self.author).post_count, 1)
+        self.assertEqual(post.comment_count, 1)
+
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+
+        post.delete()
+        self.assertEqual(self.profile(self.author).post_count, 0)
+
+    def test_post_save_keeps_comment_count(self):
+        """Редактирование поста не затирает счётчик комментариев"""
+        post = Post.objects.create(text='Какой-то там текст',
+                                   author=self.author)
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader,
+                               text='Отличная статья!')
+        stale.text = 'Новый текст'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обеих сторон"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.profile(self.author).follower_count, 1)
+        self.assertEqual(self.profile(self.reader).following_count, 1)
+
+        follow.delete()
+        self.assertEqual(self.profile(self.author).follower_count, 0)
+        self.assertEqual(self.profile(self.reader).following_count, 0)
+
+    def test_repair_counters_command(self):
+        """repair_counters исправляет рассинхронизацию счётчиков"""
+        post = Post.objects.create(text='Какой-то там текст',
+                                   author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.filter(pk=post.pk).update(comment_count=7)
+        Profile.objects.filter(user=self.author).update(post_count=5,
+                                                        follower_count=0)
+        Profile.objects.filter(user=self.reader).delete()
+
+        call_command('repair_counters', stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        author = self.profile(self.author)
+        self.assertEqual((author.post_count, author.follower_count), (1, 1))
+        self.assertEqual(self.profile(self.reader).following_count, 1)
@@ -0,0 +1,39 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from posts.cache import scope_versions
+from posts.management.commands.explain_views import explain
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ExplainViewsTests(TestCase):
+    def test_views_use_indexes(self):
+        """Все запросы страниц posts/urls.py идут по индексам"""
+        out = StringIO()
+        call_command('explain_views', stdout=out, stderr=StringIO())
+        self.assertIn('Все запросы используют индексы', out.getvalue())
+
+    def test_leaves_no_data_and_keeps_cache(self):
+        """Временные данные откатываются, кэш сайта не меняется"""
+        cache.clear()
+        scopes = ('posts', 'groups')
+        versions = scope_versions(scopes)
+        call_command('explain_views', stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(User.objects.filter(
+            username__startswith='explain_').exists())
+        self.assertEqual(scope_versions(scopes), versions)
+
+    def test_full_scan_detected(self):
+        """Поиск по неиндексированному полю считается проблемой"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План проверяется на SQLite')
+        sql, params = (Post.objects.filter(text='текст')
+                       .order_by('text').query.sql_with_params())
+        self.assertTrue(explain(sql, params))
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from posts.feed import backfill_followers, follow_feed
+from posts.models import Post, Follow, TimelineEntry
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='authorForPosts')
+        cls.reader = User.objects.create_user(username='TonyStark')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_follow_backfills_timeline(self):
+        """При подписке в ленту попадают уже опубликованные посты"""
+        self.authorized_client.get(
+            reverse('profile_follow', args=[self.author.username]))
+        self.assertEqual(list(follow_feed(self.reader)), [self.old_post])
+
+    def test_backfill_followers(self):
+        """Ленты заполняются одним запросом только для выбранных"""
+        other = User.objects.create_user(username='other')
+        Follow.objects.bulk_create([Follow(user=self.reader,
+                                           author=self.author),
+                                    Follow(user=other, author=self.author)])
+        self.assertEqual(backfill_followers(self.author.pk,
+                                            [self.reader.pk]), 1)
+        self.assertEqual(backfill_followers(self.author.pk), 1)
+        self.assertEqual(set(TimelineEntry.objects.values_list(
+            'user_id', 'post_id')), {(self.reader.pk, self.old_post.pk),
+                                     (other.pk, self.old_post.pk)})
+
+    def test_backfill_followers_empty_list(self):
+        """Пустой список подписчиков не доходит до базы"""
+        Follow.objects.bulk_create([Follow(user=self.reader,
+                                           author=self.author)])
+        with self.assertNumQueries(0):
+            self.assertEqual(backfill_followers(self.author.pk, []), 0)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_new_post_fans_out(self):
+        """Новый пост раскладывается по лентам подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+        response = self.authorized_client.get(reverse('follow_index'))
+        self.assertEqual(list(response.context['page']),
+                         [post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        """После отписки посты автора пропадают из ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.authorized_client.get(
+            reverse('profile_unfollow', args=[self.author.username]))
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(list(follow_feed(self.reader)), [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_posts_read_on_demand(self):
+        """Посты популярных авторов подмешиваются при чтении ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(list(follow_feed(self.reader)),
+                         [post, self.old_post])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_former_celebrity_posts_kept(self):
+        """Посты, не разложенные знаменитости, остаются после отписок"""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.get(user=other).delete()
+        self.assertEqual(list(follow_feed(self.reader)),
+                         [post, self.old_post])
+
+    def test_same_date_ordered_by_id(self):
+        """Посты с одинаковой датой идут в ленте по убыванию id"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {number}',
+                                     author=self.author)
+                 for number in range(3)]
+        TimelineEntry.objects.filter(user=self.reader).update(
+            pub_date=self.old_post.pub_date)
+        self.assertEqual(list(follow_feed(self.reader)),
+                         [*reversed(posts), self.old_post])
@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import metrics
+from posts.models import Post
+
+User = get_user_model()
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    """Замер запросов: Server-Timing и сводка на /metrics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='measured')
+        cls.post = Post.objects.create(text='Замеренный пост',
+                                       author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.client = Client()
+
+    def test_server_timing_header(self):
+        """Замеренный ответ сообщает время SQL, шаблонов и кэш"""
+        response = self.client.get(reverse('index'))
+        timing = response['Server-Timing']
+        for part in ('db;dur=', 'queries', 'tpl;dur=', 'cache;desc=',
+                     'total;dur='):
+            self.assertIn(part, timing)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off(self):
+        """Без сэмплирования запрос не замеряется"""
+        response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(metrics.registry.values, {})
+
+    def test_prometheus_endpoint(self):
+        """/metrics отдаёт суммы по представлениям"""
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        body = self.client.get(
+            reverse('metrics'),
+            HTTP_AUTHORIZATION='Bearer secret').content.decode()
+        self.assertIn('# TYPE yatube_requests_total counter', body)
+        self.assertIn('yatube_requests_total{view="index",method="GET",'
+                      'status="200"} 2', body)
+        self.assertIn('yatube_db_queries_total{view="index"}', body)
+        self.assertIn('yatube_cache_requests_total{view="index",'
+                      'cache="fragment",result="miss"}', body)
+
+    def test_prometheus_needs_token(self):
+        """Без верного токена /metrics не виден, даже с localhost"""
+        for header in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            response = self.client.get(reverse('metrics'), **header)
+            self.assertEqual(response.status_code, 404)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, 404)
+
+    def test_duplicate_fingerprints(self):
+        """Запросы, различающиеся только значениями, считаются повторами"""
+        recorder = metrics.RequestMetrics()
+        for sql in ('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 20',
+                    'SELECT * FROM t WHERE id IN (%s) LIMIT 40',
+                    'SELECT 1'):
+            recorder(lambda *args: None, sql, (), False, {})
+        self.assertEqual(recorder.query_count, 3)
+        self.assertEqual(recorder.duplicates(), {
+            'SELECT * FROM t WHERE id IN (...) LIMIT ?': 2})
+        metrics.registry.record('index', 'GET', 200, recorder, 0.01)
+        body = metrics.registry.render()
+        key = metrics.fingerprint_id(
+            'SELECT * FROM t WHERE id IN (%s) LIMIT 20')
+        self.assertIn(f'fingerprint="{key}"}} 1', body)
+        self.assertIn(f'# fingerprint {key} SELECT * FROM t', body)
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.nplusone import NPlusOneError, detect
+
+User = get_user_model()
+
+
+class NPlusOneTests(TestCase):
+    """Повторы одного запроса из одного места считаются N+1"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.reader = User.objects.create_user(username='reader')
+        for number in range(3):
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=cls.reader, author=author)
+            cls.post = Post.objects.create(text='Пост', author=author,
+                                           group=cls.group)
+            Comment.objects.create(post=cls.post, author=author,
+                                   text='Комментарий')
+
+    def test_lazy_foreign_key(self):
+        """post.author в цикле без select_related"""
+        with self.assertRaisesMessage(NPlusOneError,
+                                      '3× ленивое Post.author'):
+            with detect():
+                for post in Post.objects.all():
+                    post.author.username
+
+    def test_related_manager(self):
+        """post.comments.count() в цикле"""
+        with self.assertRaisesMessage(NPlusOneError,
+                                      'ленивое Post.comments'):
+            with detect():
+                for post in Post.objects.all():
+                    post.comments.count()
+
+    def test_template_loop(self):
+        """Место запроса — строка шаблона"""
+        comments = Comment.objects.filter(post__group=self.group)
+        with self.assertRaisesMessage(
+                NPlusOneError,
+                'ленивое Comment.author из include/comment_list.html:5'):
+            with detect():
+                render_to_string('include/comment_list.html',
+                                 {'comments': comments, 'post': self.post})
+
+    def test_joined_queries_pass(self):
+        """select_related убирает повторы, порог не превышен"""
+        with detect():
+            for post in Post.objects.select_related('author'):
+                post.author.username
+        with detect(threshold=4):
+            for post in Post.objects.all():
+                post.author.username
+
+    def test_log_action(self):
+        """На стенде N+1 пишется в лог"""
+        with self.assertLogs('posts.nplusone', 'WARNING') as logs:
+            with detect(action='log', label='GET /'):
+                for post in Post.objects.all():
+                    post.group.title
+        self.assertIn('N+1 запросы GET /', logs.output[0])
+
+    @override_settings(NPLUSONE_DETECT='raise')
+    def test_pages_have_no_nplusone(self):
+        """Страницы не делают N+1 запросов"""
+        cache.clear()
+        client = Client()
+        client.force_login(self.reader)
+        author = self.post.author.username
+        for url in (reverse('index'),
+                    reverse('group', args=[self.group.slug]),
+                    reverse('profile', args=[author]),
+                    reverse('post', args=[author, self.post.pk]),
+                    reverse('follow_index'),
+                    reverse('api:posts')):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 200)
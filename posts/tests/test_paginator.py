@@ -0,0 +1,95 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+from posts.paginator import CursorPaginator
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.author = User.objects.create_user(username='authorForPosts')
+        for i in range(25):
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+        # Половина постов с одинаковой датой: порядок держится на id
+        Post.objects.filter(id__lte=12).update(pub_date=timezone.now())
+        cls.expected = list(Post.objects.order_by('-pub_date', '-id')
+                            .values_list('id', flat=True))
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def paginator(self, **kwargs):
+        return CursorPaginator(Post.objects.all(), 10, **kwargs)
+
+    def test_walk_forward_and_back(self):
+        """Курсоры проходят ленту вперёд и назад без пропусков"""
+        paginator = self.paginator()
+        page = paginator.cursor_page()
+        pages = [page]
+        while page.has_next():
+            page = paginator.cursor_page(page.next_cursor)
+            pages.append(page)
+        ids = [post.id for page in pages for post in page]
+        self.assertEqual(ids, self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        backwards = paginator.cursor_page(pages[-1].previous_cursor)
+        self.assertEqual([post.id for post in backwards],
+                         [post.id for post in pages[-2]])
+        first = paginator.cursor_page(pages[1].previous_cursor)
+        self.assertEqual([post.id for post in first], self.expected[:10])
+        self.assertFalse(first.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу"""
+        page = self.paginator().cursor_page('не-курсор')
+        self.assertEqual([post.id for post in page], self.expected[:10])
+
+    def test_huge_cursor_id_returns_first_page(self):
+        """id курсора вне BIGINT — мусор, а не ошибка 500"""
+        cursor = base64.urlsafe_b64encode(json.dumps(
+            [timezone.now().isoformat(), 10 ** 30, 0]).encode()).decode()
+        self.assertIsNone(self.paginator().decode_cursor(cursor))
+        for url in (reverse('index'), reverse('api:posts')):
+            response = self.guest_client.get(url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+
+    def test_cursor_page_skips_count(self):
+        """Страница по курсору читается одним запросом без COUNT(*)"""
+        paginator = self.paginator()
+        cursor = paginator.cursor_page().next_cursor
+        with CaptureQueriesContext(connection) as context:
+            list(paginator.cursor_page(cursor))
+        self.assertEqual(len(context), 1)
+        self.assertNotIn('COUNT', context.captured_queries[0]['sql'])
+
+    def test_approximate_count(self):
+        """Приблизительный подсчёт ограничен count_limit"""
+        paginator = self.paginator(approximate_count=True, count_limit=20)
+        self.assertEqual(paginator.count, 21)
+        self.assertFalse(paginator.count_is_exact)
+
+    def test_index_cursor_links(self):
+        """Главная страница отдаёт ссылку на следующую страницу курсором"""
+        response = self.guest_client.get(reverse('index'))
+        page = response.context['page']
+        self.assertContains(response, f'?cursor={page.next_cursor}')
+
+        response = self.guest_client.get(reverse('index'),
+                                         {'cursor': page.next_cursor})
+        self.assertEqual([post.id for post in response.context['page']],
+                         self.expected[10:20])
@@ -0,0 +1,142 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post, Comment, Follow
+
+User = get_user_model()
+
+
+class FeedQueriesTests(TestCase):
+    """Число запросов в ленте не зависит от количества постов"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        cls.group = Group.objects.create(
+            title='Лев Толстой',
+            slug='tolstoy',
+            description='Группа Льва Толстого',
+        )
+
+        cls.author = User.objects.create_user(username='authorForPosts')
+        cls.reader = User.objects.create_user(username='TonyStark')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                group=FeedQueriesTests.group,
+                text='Какой-то там текст',
+                author=FeedQueriesTests.author,
+            )
+            Comment.objects.create(post=post, author=FeedQueriesTests.reader,
+                                   text='Отличная статья!')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        """Лента из одного и из десяти постов делает одинаково запросов"""
+        urls = (
+            reverse('index'),
+            reverse('group', args=[self.group.slug]),
+            reverse('profile', args=[self.author.username]),
+            reverse('follow_index'),
+        )
+        self.create_posts(1)
+        queries_before = {url: self.count_queries(url) for url in urls}
+        self.create_posts(9)
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url),
+                                 queries_before[url])
+
+    def test_feed_shows_comment_count(self):
+        """Карточка поста показывает число комментариев из аннотации"""
+        self.create_posts(1)
+        post = Post.objects.for_feed().get()
+        self.assertEqual(post.comment_count, 1)
+        cache.clear()
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+
+
+class PostViewQueriesTests(TestCase):
+    """Страница поста: постоянное число запросов и проверка автора"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('post', args=['writer', self.post.pk])
+
+    def comment(self, count):
+        for _ in range(count):
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text='Комментарий')
+
+    def count_queries(self, client):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    @override_settings(COMMENTS_PAGE_SIZE=5)
+    def test_queries_do_not_grow_with_comments(self):
+        """Шесть и тридцать комментариев — одинаковое число запросов"""
+        guest, user = Client(), Client()
+        user.force_login(self.reader)
+        self.comment(6)
+        before = [self.count_queries(client) for client in (guest, user)]
+        self.comment(24)
+        after = [self.count_queries(client) for client in (guest, user)]
+        self.assertEqual(after, before)
+        # Пост с автором, профилем и группой, порция комментариев с
+        # авторами и проверка, есть ли следующая порция.
+        self.assertEqual(before[0], 3)
+
+    def test_comments_are_paginated(self):
+        """Страница показывает первые комментарии, фрагменты — остальные"""
+        size = 3
+        self.comment(size * 2 + 1)
+        with self.settings(COMMENTS_PAGE_SIZE=size):
+            response = Client().get(self.url)
+            self.assertEqual(len(response.context['comments']), size)
+            seen = [comment.id for comment in response.context['comments']]
+            while response.context['comments_next']:
+                response = Client().get(
+                    reverse('post_comments', args=['writer', self.post.pk]),
+                    {'cursor': response.context['comments_next']})
+                self.assertTemplateUsed(response,
+                                        'include/comment_list.html')
+                seen += [comment.id
+                         for comment in response.context['comments']]
+        self.assertEqual(seen, list(
+            self.post.comments.order_by('-created', '-id')
+            .values_list('id', flat=True)))
+        self.assertNotContains(response, 'Показать ещё')
+
+    def test_wrong_username_redirects(self):
+        """Пост по адресу другого пользователя перенаправляет на свой"""
+        response = Client().get(reverse('post', args=['reader',
+                                                      self.post.pk]))
+        self.assertRedirects(response, self.url)
@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, router
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import routers
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+def replicate():
+    """Замена репликации: основная база целиком копируется в реплику"""
+    source, target = connections['default'], connections[routers.REPLICA]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Основная база — тестовая SQLite, реплика — отдельный файл"""
+    databases = {'default', routers.REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[routers.REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[routers.REPLICA].close()
+        del connections[routers.REPLICA]
+        del connections.databases[routers.REPLICA]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer')
+        self.post = Post.objects.create(text='Реплицированный пост',
+                                        author=self.author)
+        replicate()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_writes_go_to_primary(self):
+        """Запись всегда в основную базу, чтение вне представлений тоже"""
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+        with routers.replica_reads():
+            self.assertEqual(router.db_for_read(Post), routers.REPLICA)
+            self.assertEqual(router.db_for_write(Post), 'default')
+
+    @override_settings(REPLICA_MAX_LAG=0)
+    def test_feed_reads_replica(self):
+        """Лента читает реплику: пост виден после репликации"""
+        Post.objects.create(text='Ещё не на реплике', author=self.author)
+        response = Client().get(reverse('index'))
+        self.assertContains(response, 'Реплицированный пост')
+        self.assertNotContains(response, 'Ещё не на реплике')
+        replicate()
+        cache.clear()
+        response = Client().get(reverse('index'))
+        self.assertContains(response, 'Ещё не на реплике')
+
+    @mock.patch('posts.routers.changed_recently', return_value=False)
+    def test_author_reads_own_write(self, changed_recently):
+        """После записи автор читает с основной базы, другие — с реплики"""
+        url = reverse('post', args=['writer', self.post.pk])
+        response = self.client.post(
+            reverse('add_comment', args=['writer', self.post.pk]),
+            {'text': 'Свежий комментарий'})
+        self.assertIn(routers.STICKY_COOKIE, response.cookies)
+        self.assertContains(self.client.get(url), 'Свежий комментарий')
+        self.assertNotContains(Client().get(url), 'Свежий комментарий')
+
+    def test_recent_change_reads_primary(self):
+        """Пока реплика может отставать, страница читается с основной базы"""
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Только что')
+        response = Client().get(reverse('post', args=['writer',
+                                                      self.post.pk]))
+        self.assertContains(response, 'Только что')
+
+    def test_recent_edit_reads_primary(self):
+        """Пост, найденный для ETag на реплике, перечитывается с основной"""
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = Client().get(reverse('post', args=['writer',
+                                                      self.post.pk]))
+        self.assertContains(response, 'Исправленный пост')
+        Post.objects.create(text='Второй пост', author=self.author)
+        response = Client().get(reverse('api:profile', args=['writer']))
+        self.assertEqual(response.json()['post_count'], 2)
+
+    @override_settings(REPLICA_MAX_LAG=0)
+    def test_search_reads_replica(self):
+        """Поиск и чтение найденных постов идут в одну базу"""
+        Post.objects.filter(pk=self.post.pk).delete()
+        response = Client().get(reverse('search'), {'q': 'реплицированный'})
+        self.assertContains(response, '<mark>Реплицированный</mark> пост')
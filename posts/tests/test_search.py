@@ -0,0 +1,96 @@
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from posts.models import Group, Post
+from posts.search import SearchPaginator, highlight, query_terms
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(title='Коты', slug='cats',
+                                         description='Про котов')
+        cls.cat = Post.objects.create(
+            text='Кот спит на ёлке', author=cls.author, group=cls.group)
+        cls.cats = Post.objects.create(
+            text='Истории о котах и собаках', author=cls.other)
+        cls.dog = Post.objects.create(text='Собака лает', author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, **kwargs):
+        paginator = SearchPaginator(query, 10, **kwargs)
+        return [post.pk for post in paginator.cursor_page()]
+
+    def test_cyrillic_forms_and_yo(self):
+        """Падежи и «ё» находят друг друга, регистр не важен"""
+        self.assertCountEqual(self.found('котами'),
+                              [self.cat.pk, self.cats.pk])
+        self.assertEqual(self.found('ЕЛКА'), [self.cat.pk])
+        self.assertEqual(self.found('собак лает'), [self.dog.pk])
+
+    def test_filters(self):
+        """Фильтры по группе и автору сужают выдачу"""
+        self.assertEqual(self.found('кот', group=self.group), [self.cat.pk])
+        self.assertEqual(self.found('кот', author=self.other), [self.cats.pk])
+
+    def test_index_follows_edit_and_delete(self):
+        """Сигналы обновляют индекс при правке и удалении поста"""
+        self.dog.text = 'Попугай молчит'
+        self.dog.save()
+        self.assertEqual(self.found('собака'), [self.cats.pk])
+        self.assertEqual(self.found('попугай'), [self.dog.pk])
+        self.cats.delete()
+        self.assertEqual(self.found('собака'), [])
+
+    def test_keyset_pages(self):
+        """Страницы по курсору не теряют и не повторяют результаты"""
+        for number in range(5):
+            Post.objects.create(text=f'Кот номер {number}', author=self.author)
+        paginator = SearchPaginator('кот', 3)
+        first = paginator.cursor_page()
+        second = paginator.cursor_page(first.next_cursor)
+        third = paginator.cursor_page(second.next_cursor)
+        seen = [post.pk for page in (first, second, third) for post in page]
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+        self.assertFalse(third.has_next())
+        back = paginator.cursor_page(second.previous_cursor)
+        self.assertEqual([post.pk for post in back],
+                         [post.pk for post in first])
+
+    def test_huge_cursor_id(self):
+        """id курсора вне BIGINT отдаёт первую страницу"""
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([0.5, 10 ** 30, 0]).encode()).decode()
+        self.assertIsNone(SearchPaginator('кот', 10).decode_cursor(cursor))
+        response = self.client.get(reverse('search'),
+                                   {'q': 'кот', 'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+
+    def test_highlight_escapes(self):
+        """Подсветка по исходному тексту, HTML экранируется"""
+        self.assertEqual(
+            highlight('<b>Ёлки</b> и ель', query_terms('елка')),
+            '&lt;b&gt;<mark>Ёлки</mark>&lt;/b&gt; и ель')
+
+    def test_search_page(self):
+        """Страница /search/ подсвечивает совпадения и хранит фильтры"""
+        for number in range(11):
+            Post.objects.create(text=f'Кот {number}', author=self.author)
+        response = self.client.get(reverse('search'),
+                                   {'q': 'кот', 'author': 'writer'})
+        self.assertContains(response, '<mark>Кот</mark>', count=10)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82&amp;'
+                                      'author=writer&cursor=')
+        response = self.client.get(reverse('search'), {'q': '!!!'})
+        self.assertContains(response, 'Ничего не найдено')
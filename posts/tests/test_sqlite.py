@@ -0,0 +1,26 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from posts.sqlite import configure_connection
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Настройки только для SQLite')
+class SqlitePragmaTests(TransactionTestCase):
+    # Не TestCase: synchronous нельзя менять внутри его транзакции.
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connection_is_configured(self):
+        """Соединение получает PRAGMA из SQLITE_PRAGMAS"""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('temp_store'), 2)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            configure_connection(sender=None, connection=connection)
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        configure_connection(sender=None, connection=connection)
@@ -0,0 +1,151 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings)
+from django.urls import reverse
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_file(name='image.png', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(200, 0, 0)).save(buffer, 'png')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_BACKGROUND=False)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='authorForPosts')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_new_post_gets_thumbnail(self):
+        """post_new строит миниатюру, лента отдаёт её готовый URL"""
+        self.authorized_client.post(reverse('new_post'),
+                                    {'text': 'Пост с картинкой',
+                                     'image': image_file()})
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertTrue(post.thumbnail)
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, post.thumbnail_url)
+
+    def test_variants_in_picture(self):
+        """Варианты всех ширин и WebP попадают в <picture> с srcset"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file(size=(1600, 900)))
+        variants = thumbnails.generate(post.pk)
+        self.assertIn('webp', variants)
+        self.assertEqual([width for width, _ in variants['jpeg']],
+                         [480, 960, 1440])
+        post.refresh_from_db()
+        storage = post.image.storage
+        for sources in variants.values():
+            for width, name in sources:
+                with Image.open(storage.path(name)) as image:
+                    self.assertEqual(image.width, width)
+        self.assertEqual(post.thumbnail, dict(variants['jpeg'])[960])
+
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"')
+        webp_480 = storage.url(variants['webp'][0][1])
+        self.assertContains(response, f'{webp_480} 480w')
+
+    def test_small_image_keeps_one_width(self):
+        """Маленькая картинка даёт один вариант самой малой ширины"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file(size=(300, 200)))
+        variants = thumbnails.generate(post.pk)
+        self.assertEqual([width for width, _ in variants['jpeg']], [480])
+
+    def test_placeholder_until_ready(self):
+        """Пока миниатюры нет, вместо картинки выводится заглушка"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file())
+        response = self.authorized_client.get(reverse('index'))
+        self.assertNotContains(response, '<img class="card-img"')
+        self.assertContains(response, 'card-img bg-light')
+
+        thumbnails.generate(post.pk)
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, '<img class="card-img"')
+
+    def test_edit_replaces_thumbnail(self):
+        """Новая картинка в post_edit заменяет миниатюру"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file())
+        thumbnails.generate(post.pk)
+        old_thumbnail = Post.objects.get(pk=post.pk).thumbnail
+        self.authorized_client.post(
+            reverse('post_edit', args=[self.author.username, post.pk]),
+            {'text': 'Пост', 'image': image_file('other.png', (900, 900))})
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        self.assertNotEqual(post.thumbnail, old_thumbnail)
+        self.assertFalse(post.image.storage.exists(old_thumbnail))
+
+    def test_stale_job_is_ignored(self):
+        """Задача для заменённой картинки ничего не сохраняет"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file())
+        self.assertIsNone(thumbnails.generate(post.pk, 'posts/old.png'))
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+
+    def test_image_replaced_during_build(self):
+        """Варианты старой картинки не затирают новую и удаляются"""
+        post = Post.objects.create(text='Пост', author=self.author,
+                                   image=image_file())
+        build_variants = thumbnails.build_variants
+        built = {}
+
+        def replaced_meanwhile(image_field):
+            built.update(build_variants(image_field))
+            Post.objects.filter(pk=post.pk).update(image='posts/new.png')
+            return built
+
+        with mock.patch.object(thumbnails, 'build_variants',
+                               replaced_meanwhile):
+            self.assertIsNone(thumbnails.generate(post.pk))
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail, '')
+        for sources in built.values():
+            for _, name in sources:
+                self.assertFalse(post.image.storage.exists(name))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_BACKGROUND=False)
+class ThumbnailCleanupTests(TransactionTestCase):
+    def test_delete_removes_variants(self):
+        """Удаление поста удаляет файлы его вариантов после коммита"""
+        author = User.objects.create_user(username='authorForPosts')
+        post = Post.objects.create(text='Пост', author=author,
+                                   image=image_file())
+        variants = thumbnails.generate(post.pk)
+        storage = post.image.storage
+        Post.objects.get(pk=post.pk).delete()
+        for sources in variants.values():
+            for _, name in sources:
+                self.assertFalse(storage.exists(name))
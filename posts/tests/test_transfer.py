@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.feed import follow_feed
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+from users.models import Profile
+
+User = get_user_model()
+
+
+class TransferTests(TestCase):
+    """Выгрузка и загрузка постов, комментариев и подписок"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        group = Group.objects.create(title='Лев Толстой', slug='tolstoy',
+                                     description='Группа Льва Толстого')
+        author = User.objects.create_user(username='leo')
+        reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Война и мир', author=author,
+                                        group=group)
+        Post.objects.create(text='Без группы, "с кавычками",\nи строками',
+                            author=author)
+        Comment.objects.create(post=self.post, author=reader,
+                               text='Отличная книга')
+        Follow.objects.create(user=reader, author=author)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self, name):
+        path = os.path.join(self.directory, name)
+        call_command('export_posts', output=path)
+        with open(path, encoding='utf-8') as file:
+            return path, file.read()
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command('import_posts', path, stdout=out, **options)
+        return out.getvalue()
+
+    def assert_round_trip(self, name):
+        path, exported = self.export(name)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+        self.load(path)
+        self.assertEqual(self.export('again-' + name)[1], exported)
+        # Производные данные, которые обычно ведут сигналы.
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(Profile.objects.get(user__username='leo')
+                         .follower_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post=post).exists())
+        response = Client().get(reverse('search'), {'q': 'война'})
+        self.assertEqual(list(response.context['page'].object_list), [post])
+
+    def test_ndjson_round_trip(self):
+        self.assert_round_trip('dump.ndjson')
+
+    def test_csv_round_trip(self):
+        self.assert_round_trip('dump.csv')
+
+    def test_import_is_idempotent(self):
+        """Повторная загрузка пропускает то, что уже есть"""
+        path, _ = self.export('dump.ndjson')
+        out = self.load(path)
+        for kind in ('group', 'post', 'comment', 'follow'):
+            self.assertIn(f'{kind}: загружено 0', out)
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_resume(self):
+        """Прерванная загрузка продолжается с последней пачки"""
+        path, exported = self.export('dump.ndjson')
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+        with mock.patch('posts.transfer.Importer.load_comments',
+                        side_effect=RuntimeError('обрыв')):
+            with self.assertRaises(RuntimeError):
+                self.load(path, batch_size=1)
+        with open(f'{path}.progress', encoding='utf-8') as file:
+            self.assertEqual(json.load(file), {'records': 3})
+        self.assertFalse(Comment.objects.exists())
+
+        with self.assertRaises(CommandError):
+            self.load(path)
+        out = self.load(path, resume=True)
+        self.assertIn('post: загружено 0', out)
+        self.assertIn('comment: загружено 1', out)
+        self.assertFalse(os.path.exists(f'{path}.progress'))
+        self.assertEqual(self.export('again.ndjson')[1], exported)
+
+    def test_conflicting_ids_refused(self):
+        """Пост базы с тем же id, но другим текстом, не считается своим"""
+        path, _ = self.export('dump.ndjson')
+        Post.objects.filter(pk=self.post.pk).update(text='Анна Каренина')
+        with self.assertRaisesRegex(CommandError, 'не совпадает'):
+            self.load(path)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_bad_date_refused(self):
+        """Запись без даты — ошибка команды, а не IntegrityError"""
+        path = os.path.join(self.directory, 'bad.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'type': 'post', 'id': 100,
+                                   'author': 'leo', 'text': 'Без даты',
+                                   'date': None}) + '\n')
+        with self.assertRaisesRegex(CommandError, 'Неверная дата'):
+            self.load(path)
+        self.assertFalse(Post.objects.filter(pk=100).exists())
+
+    def test_posts_reach_existing_followers(self):
+        """Загруженные посты видны в ленте тех, кто уже подписан"""
+        path, _ = self.export('dump.ndjson')
+        Post.objects.all().delete()
+        self.load(path)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(len(follow_feed(reader)), 2)
@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post
+from posts.uploads import LimitedTemporaryFileUploadHandler
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+ORIENTATION = 0x0112
+GPS_INFO = 0x8825
+
+
+def jpeg_file(size=(400, 200), orientation=None, name='photo.jpg'):
+    image = Image.new('RGB', size, color=(0, 120, 200))
+    exif = Image.Exif()
+    exif[GPS_INFO] = {1: 'N'}
+    if orientation:
+        exif[ORIENTATION] = orientation
+    buffer = BytesIO()
+    image.save(buffer, 'jpeg', exif=exif.tobytes())
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, THUMBNAIL_BACKGROUND=False)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def new_post(self, image):
+        return self.client.post(reverse('new_post'),
+                                {'text': 'Пост с фото', 'image': image})
+
+    def test_exif_stripped_and_orientation_applied(self):
+        """EXIF с GPS удаляется, поворот применяется к пикселям"""
+        self.new_post(jpeg_file(orientation=6))
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (200, 400))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(IMAGE_MAX_SIDE=300)
+    def test_large_image_downscaled(self):
+        """Длинная сторона сохранённого оригинала не больше лимита"""
+        self.new_post(jpeg_file(size=(1200, 600)))
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (300, 150))
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_too_many_bytes_rejected(self):
+        """Файл больше лимита не сохраняется, форма сообщает об ошибке"""
+        response = self.new_post(jpeg_file(size=(800, 800)))
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 1.0\xa0KB.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=10000)
+    def test_too_many_pixels_rejected(self):
+        """Размеры проверяются по заголовку до декодирования"""
+        response = self.new_post(jpeg_file(size=(200, 100)))
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение 200×100 слишком большое.')
+
+    @override_settings(IMAGE_MAX_SIDE=100)
+    def test_edit_reencodes_new_image(self):
+        """post_edit перекодирует новую картинку так же, как post_new"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.client.post(
+            reverse('post_edit', args=[self.author.username, post.pk]),
+            {'text': 'Пост', 'image': jpeg_file(orientation=6)})
+        post.refresh_from_db()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=10)
+    def test_handler_stops_writing_after_limit(self):
+        """Обработчик не пишет на диск больше лимита, но считает размер"""
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file('image', 'a.jpg', 'image/jpeg', None)
+        for chunk in (b'x' * 8, b'x' * 8, b'x' * 8):
+            handler.receive_data_chunk(chunk, 0)
+        uploaded = handler.file_complete(24)
+        self.assertEqual(uploaded.size, 24)
+        with open(uploaded.temporary_file_path(), 'rb') as written:
+            self.assertEqual(len(written.read()), 8)
+        uploaded.close()
@@ -236,7 +236,8 @@ class ProjectViewsTests(TestCase):
         response_after_follow = self.authorized_client.get(
             reverse('follow_index'))
 
-        self.assertEqual(response.content, response_after_follow.content)
+        self.assertNotContains(response, self.post.text)
+        self.assertContains(response_after_follow, self.post.text)
 
     def test_add_comment_not_login_user(self):
         """
@@ -0,0 +1,159 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts import cache, feed, metrics, writes
+from posts.models import Comment, Post
+from users.models import Profile
+
+User = get_user_model()
+
+
+@override_settings(WRITE_BATCH_LINGER=0.05, WRITE_RETRY_BACKOFF=0)
+class WriteBufferTests(TransactionTestCase):
+    def submit_concurrently(self, buffer, items):
+        errors = {}
+
+        def submit(item):
+            try:
+                buffer.submit(item)
+            except Exception as error:
+                errors[item] = error
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=[item])
+                   for item in items]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_concurrent_items_share_batch(self):
+        """Параллельные запросы записываются одной пачкой"""
+        batches = []
+        buffer = writes.WriteBuffer(batches.append)
+        errors = self.submit_concurrently(buffer, range(10))
+        self.assertEqual(errors, {})
+        self.assertEqual(sorted(sum(batches, [])), list(range(10)))
+        self.assertLess(len(batches), 10)
+        metrics = buffer.metrics()
+        self.assertEqual(metrics['items'], 10)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertIsNotNone(metrics['flush_ms_p95'])
+
+    def test_error_reaches_only_its_item(self):
+        """Ошибка одного item не роняет остальные в той же пачке"""
+        written = []
+
+        def flush(items):
+            if 3 in items:
+                raise ValueError('плохой item')
+            written.extend(items)
+
+        buffer = writes.WriteBuffer(flush)
+        errors = self.submit_concurrently(buffer, range(6))
+        self.assertEqual(list(errors), [3])
+        self.assertEqual(sorted(written), [0, 1, 2, 4, 5])
+        self.assertEqual(buffer.metrics()['failures'], 1)
+
+    def test_lock_errors_are_retried(self):
+        """«database is locked» повторяется, другие ошибки — нет"""
+        calls = []
+
+        def flush(items):
+            calls.append(items)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+
+        buffer = writes.WriteBuffer(flush)
+        buffer.submit('item')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(buffer.metrics()['retries'], 2)
+        with self.assertRaises(OperationalError):
+            writes.retry_on_lock(mock.Mock(
+                side_effect=OperationalError('no such table')))
+
+
+class CommentWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def test_author_reads_own_comment(self):
+        """После редиректа автор сразу видит комментарий и счётчик"""
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse('add_comment', args=['writer', self.post.pk]),
+            {'text': 'Свой комментарий'}, follow=True)
+        self.assertContains(response, 'Свой комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(Comment.objects.get().author, self.author)
+
+
+@override_settings(WRITE_RETRY_BACKOFF=0)
+class PostRetryTests(TransactionTestCase):
+    def test_lock_in_signal_handler_is_retried(self):
+        """Блокировка в обработчике post_save повторяет вставку поста"""
+        author = User.objects.create_user(username='writer')
+        fan_out_post = feed.fan_out_post
+        calls = []
+
+        def locked_once(post):
+            calls.append(post.pk)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            fan_out_post(post)
+
+        post = Post(text='Новый пост', author=author)
+        with mock.patch.object(feed, 'fan_out_post', locked_once):
+            writes.save_post(post)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Post.objects.get().pk, post.pk)
+        self.assertEqual(Profile.objects.get(user=author).post_count, 1)
+
+
+class CommitCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.post = Post.objects.create(text='Пост', author=self.author)
+
+    def bumped_scopes(self, save):
+        """Области, чьи версии сдвинуты уже после коммита"""
+        committed = set()
+
+        def new_versions(scopes):
+            if not connection.in_atomic_block:
+                committed.update(scopes)
+
+        with mock.patch.object(cache, 'new_versions', new_versions):
+            save()
+        return committed
+
+    def test_comment_bumps_after_commit(self):
+        """Версии ленты сдвигаются после коммита пачки комментариев"""
+        comment = Comment(post=self.post, author=self.author, text='Текст')
+        self.assertIn('posts', self.bumped_scopes(
+            lambda: writes.save_comment(comment)))
+
+    def test_post_bumps_after_commit(self):
+        """Версии ленты сдвигаются после коммита нового поста"""
+        post = Post(text='Новый пост', author=self.author)
+        self.assertIn(f'author:{self.author.pk}', self.bumped_scopes(
+            lambda: writes.save_post(post)))
+
+    def test_buffer_on_metrics_page(self):
+        """Очередь записи комментариев видна на /metrics"""
+        writes.comment_buffer.submit(
+            Comment(post=self.post, author=self.author, text='Текст'))
+        body = metrics.registry.render()
+        self.assertIn('yatube_write_queue_depth{buffer="comments"} 0', body)
+        self.assertIn('yatube_write_flush_seconds{buffer="comments",'
+                      'quantile="0.95"}', body)
@@ -0,0 +1,169 @@
+"""
+Фоновая подготовка миниатюр для карточек постов.
+
+Раньше миниатюра строилась тегом {% thumbnail %} прямо при рендере
+ленты: первый просмотр нового изображения ждал декодирования и
+масштабирования в Pillow, а каждая карточка ходила в KV-хранилище
+sorl-thumbnail. Теперь post_new и post_edit ставят задачу в пул потоков
+после коммита транзакции, результат сохраняется в Post.thumbnail, а
+шаблон отдаёт готовый URL или заглушку, пока миниатюры нет.
+
+Для каждой картинки строится набор вариантов карточки нескольких
+ширин (IMAGE_VARIANT_WIDTHS) в WebP и AVIF, если Pillow их умеет, и
+в JPEG для старых браузеров. Варианты лежат рядом с оригиналом в
+posts/variants/, список хранится в Post.variants и выводится в
+<picture> с srcset.
+"""
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from . import signals
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+CARD_WIDTH = 960
+CARD_RATIO = 339 / CARD_WIDTH
+VARIANTS_DIR = 'posts/variants'
+SAVE_OPTIONS = {
+    'avif': {'quality': 60},
+    'webp': {'quality': 75, 'method': 4},
+    'jpeg': {'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+_executor = None
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails')
+    return _executor
+
+
+def image_formats():
+    """Форматы вариантов от самого экономного к запасному JPEG"""
+    try:
+        import pillow_avif  # noqa
+    except ImportError:
+        pass
+    Image.init()
+    formats = []
+    if 'AVIF' in Image.SAVE:
+        formats.append('avif')
+    if features.check('webp'):
+        formats.append('webp')
+    return formats + ['jpeg']
+
+
+def variant_widths(source_width):
+    """Ширины не больше исходной, но хотя бы одна — самая маленькая"""
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    return [width for width in widths if width <= source_width] or widths[:1]
+
+
+def build_variants(image_field):
+    """
+    Нарезает карточку 960x339 (обрезка по центру) нужных ширин во всех
+    форматах и сохраняет файлы в хранилище оригинала.
+    Возвращает {формат: [[ширина, путь], ...]}.
+    """
+    storage = image_field.storage
+    stem = os.path.splitext(os.path.basename(image_field.name))[0]
+    image_field.open('rb')
+    try:
+        with Image.open(image_field) as source:
+            source = ImageOps.exif_transpose(source).convert('RGB')
+    finally:
+        image_field.close()
+
+    variants = {}
+    for width in variant_widths(source.width):
+        size = (width, round(width * CARD_RATIO))
+        card = ImageOps.fit(source, size, Image.LANCZOS)
+        for image_format in image_formats():
+            buffer = BytesIO()
+            card.save(buffer, image_format.upper(),
+                      **SAVE_OPTIONS[image_format])
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            name = storage.save(
+                f'{VARIANTS_DIR}/{stem}-{width}.{extension}',
+                ContentFile(buffer.getvalue()))
+            variants.setdefault(image_format, []).append([width, name])
+    return variants
+
+
+def delete_files(storage, variants):
+    for sources in variants.values():
+        for _, name in sources:
+            storage.delete(name)
+
+
+def delete_variants(post):
+    delete_files(post.image.storage, post.variant_sources())
+
+
+def generate(post_id, image_name=None):
+    """
+    Строит варианты карточки и сохраняет их в посте. Если изображение
+    успели заменить — до начала или во время построения, — результат
+    устарел: он не сохраняется, а его файлы удаляются.
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return None
+    if image_name is not None and post.image.name != image_name:
+        return None
+    variants = build_variants(post.image)
+    # Запасной src — JPEG полной ширины карточки или самый крупный.
+    jpeg = dict(variants['jpeg'])
+    saved = Post.objects.filter(pk=post.pk, image=post.image.name).update(
+        thumbnail=jpeg.get(CARD_WIDTH, variants['jpeg'][-1][1]),
+        variants=json.dumps(variants), updated=timezone.now())
+    if not saved:
+        delete_files(post.image.storage, variants)
+        return None
+    # update() не шлёт post_save: карточки сбрасываем сами.
+    signals.bump_post_caches(post.group_id, post.author_id)
+    return variants
+
+
+def _run_in_background(post_id, image_name):
+    close_old_connections()
+    try:
+        generate(post_id, image_name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюру поста %s', post_id)
+    finally:
+        connection.close()
+
+
+def schedule(post):
+    """
+    Сбрасывает устаревшую миниатюру и ставит построение новой после
+    коммита текущей транзакции.
+    """
+    if post.thumbnail:
+        delete_variants(post)
+        post.thumbnail = ''
+        post.variants = ''
+        post.save(update_fields=('thumbnail', 'variants'))
+    if not post.image:
+        return
+    image_name = post.image.name
+    if not settings.THUMBNAIL_BACKGROUND:
+        generate(post.pk, image_name)
+        return
+    transaction.on_commit(lambda: executor().submit(
+        _run_in_background, post.pk, image_name))
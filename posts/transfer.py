@@ -0,0 +1,340 @@
+"""
+Потоковый перенос постов, комментариев и подписок (export_posts,
+import_posts).
+
+Каждая строка файла — одна запись: группа, пост, комментарий или
+подписка, в таком порядке. NDJSON пишет объект на строку, CSV —
+строку с колонками FIELDS. Авторы и группы записываются по username и
+slug, посты и комментарии сохраняют свои id, поэтому комментарий
+ссылается на пост по id без таблицы соответствий.
+
+Выгрузка читает таблицы iterator(chunk_size), загрузка пишет
+bulk_create пачками по batch_size, каждую в своей транзакции. username
+и slug переводятся в id одним запросом на пачку через ограниченный
+LRU-кэш Lookup, недостающие пользователи и группы создаются. Память
+не растёт с размером файла.
+
+Записи, которые уже есть в базе (тот же id, slug или пара подписки),
+пропускаются. Пост или комментарий с тем же id, но другим автором,
+текстом или датой — чужая запись: загрузка останавливается, иначе
+файл приписал бы свои комментарии постам базы. После каждой пачки
+число прочитанных записей пишется
+в файл прогресса: прерванную загрузку можно продолжить с того же
+места. bulk_create не вызывает сигналы, поэтому загрузка сама
+индексирует посты для поиска, раскладывает их по лентам подписчиков,
+заполняет ленты новых подписчиков и пересчитывает счётчики.
+"""
+import csv
+import itertools
+import json
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import feed, search
+from .models import Comment, Follow, Group, Post, User
+
+FIELDS = ('type', 'id', 'author', 'user', 'post', 'group', 'title', 'text',
+          'date', 'image')
+LOOKUP_CACHE_SIZE = 100000
+# Не больше параметров в одном IN, чем допускают старые SQLite.
+IN_CHUNK = 500
+
+
+def chunks(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Даёт записать даты из прошлого: auto_now(_add) заменил бы их now()"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def record_dates():
+    return explicit_dates(Post._meta.get_field('pub_date'),
+                          Post._meta.get_field('updated'),
+                          Comment._meta.get_field('created'))
+
+
+def export_records(chunk_size):
+    """Записи всех групп, постов, комментариев и подписок по порядку"""
+    groups = Group.objects.order_by('pk').values_list(
+        'slug', 'title', 'description')
+    for slug, title, description in groups.iterator(chunk_size=chunk_size):
+        yield {'type': 'group', 'group': slug, 'title': title,
+               'text': description}
+
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image')
+    for pk, author, group, text, date, image in posts.iterator(
+            chunk_size=chunk_size):
+        yield {'type': 'post', 'id': pk, 'author': author, 'group': group,
+               'text': text, 'date': date.isoformat(), 'image': image}
+
+    comments = Comment.objects.order_by('pk').values_list(
+        'pk', 'post_id', 'author__username', 'text', 'created')
+    for pk, post_id, author, text, date in comments.iterator(
+            chunk_size=chunk_size):
+        yield {'type': 'comment', 'id': pk, 'post': post_id,
+               'author': author, 'text': text, 'date': date.isoformat()}
+
+    follows = Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username')
+    for user, author in follows.iterator(chunk_size=chunk_size):
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+def write_ndjson(file, records):
+    for record in records:
+        record = {key: value for key, value in record.items()
+                  if value not in (None, '')}
+        file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def write_csv(file, records):
+    writer = csv.DictWriter(file, FIELDS)
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+
+
+def read_ndjson(file, skip=0):
+    lines = (line for line in file if line.strip())
+    for line in itertools.islice(lines, skip, None):
+        yield json.loads(line)
+
+
+def read_csv(file, skip=0):
+    # Пустая ячейка CSV — отсутствующее значение, как в NDJSON.
+    for row in itertools.islice(csv.DictReader(file), skip, None):
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+WRITERS = {'ndjson': write_ndjson, 'csv': write_csv}
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+class Lookup:
+    """
+    Перевод естественного ключа (username, slug) в id. Пачка ключей
+    разрешается одним запросом, недостающие строки создаёт create,
+    кэш хранит не больше size последних ключей.
+    """
+
+    def __init__(self, model, field, create, size=LOOKUP_CACHE_SIZE):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.size = size
+        self.ids = OrderedDict()
+
+    def fetch(self, keys):
+        found = {}
+        for batch in chunks(keys, IN_CHUNK):
+            found.update(self.model.objects.filter(
+                **{f'{self.field}__in': batch}).values_list(self.field, 'pk'))
+        return found
+
+    def resolve(self, keys):
+        """{ключ: id} для ключей пачки"""
+        keys = {key for key in keys if key is not None}
+        resolved = {key: self.ids[key] for key in keys if key in self.ids}
+        for key in resolved:
+            self.ids.move_to_end(key)
+        missing = keys - resolved.keys()
+        if missing:
+            found = self.fetch(missing)
+            absent = missing - found.keys()
+            if absent:
+                self.create(absent)
+                found.update(self.fetch(absent))
+            resolved.update(found)
+            self.ids.update(found)
+            while len(self.ids) > self.size:
+                self.ids.popitem(last=False)
+        return resolved
+
+
+def create_users(usernames):
+    # Пароль непригоден для входа: перенесённый пользователь задаёт
+    # его через восстановление пароля.
+    password = make_password(None)
+    User.objects.bulk_create(
+        [User(username=username, password=password)
+         for username in usernames], ignore_conflicts=True)
+
+
+def create_groups(slugs):
+    Group.objects.bulk_create([Group(slug=slug, title=slug) for slug in slugs],
+                              ignore_conflicts=True)
+
+
+def existing(model, field, values):
+    """Какие из values уже есть в колонке field"""
+    found = set()
+    for batch in chunks(values, IN_CHUNK):
+        found.update(model.objects.filter(**{f'{field}__in': batch})
+                     .values_list(field, flat=True))
+    return found
+
+
+def matching(model, fields, expected):
+    """
+    Какие из id в expected ({id: значения fields}) уже есть в базе.
+    Строка с тем же id, но другими значениями — ValueError
+    """
+    found = set()
+    for batch in chunks(expected, IN_CHUNK):
+        rows = model.objects.filter(pk__in=batch).values_list('pk', *fields)
+        for pk, *values in rows:
+            if tuple(values) != expected[pk]:
+                raise ValueError(
+                    f'{model.__name__} {pk} в базе не совпадает '
+                    f'с записью файла: загрузка возможна только в базу '
+                    f'без других записей с такими id')
+            found.add(pk)
+    return found
+
+
+def parse_date(value):
+    date = parse_datetime(value) if value else None
+    if date is None:
+        raise ValueError(f'Неверная дата: {value!r}')
+    return date
+
+
+class Importer:
+    def __init__(self, lookup_size=LOOKUP_CACHE_SIZE):
+        self.users = Lookup(User, 'username', create_users, lookup_size)
+        self.groups = Lookup(Group, 'slug', create_groups, lookup_size)
+        self.handlers = {'group': self.load_groups, 'post': self.load_posts,
+                         'comment': self.load_comments,
+                         'follow': self.load_follows}
+        self.loaded = dict.fromkeys(self.handlers, 0)
+
+    def run(self, records, batch_size, on_batch=None):
+        """
+        Загружает записи пачками одного типа: комментарии идут после
+        постов, на которые ссылаются. on_batch(n) вызывается после
+        коммита пачки из n записей. loaded считает записи, которых ещё не
+        было в базе
+        """
+        with record_dates():
+            for kind, batch in itertools.groupby(
+                    records, key=lambda record: record['type']):
+                handler = self.handlers.get(kind)
+                if handler is None:
+                    raise ValueError(f'Неизвестный тип записи: {kind}')
+                for part in chunks(batch, batch_size):
+                    with transaction.atomic():
+                        handler(part)
+                    if on_batch is not None:
+                        on_batch(len(part))
+        self.reset_sequences()
+
+    def load_groups(self, records):
+        loaded = existing(Group, 'slug',
+                          {record['group'] for record in records})
+        groups = {record['group']: Group(slug=record['group'],
+                                         title=record.get('title', ''),
+                                         description=record.get('text', ''))
+                  for record in records if record['group'] not in loaded}
+        Group.objects.bulk_create(groups.values())
+        self.loaded['group'] += len(groups)
+
+    def load_posts(self, records):
+        for record in records:
+            record['date'] = parse_date(record.get('date'))
+        loaded = matching(Post, ('author__username', 'text', 'pub_date'), {
+            int(record['id']): (record.get('author'), record['text'],
+                                record['date'])
+            for record in records})
+        records = [record for record in records
+                   if int(record['id']) not in loaded]
+        authors = self.users.resolve(record.get('author')
+                                     for record in records)
+        groups = self.groups.resolve(record.get('group')
+                                     for record in records)
+        posts = [Post(pk=int(record['id']), text=record['text'],
+                      author_id=authors.get(record.get('author')),
+                      group_id=groups.get(record.get('group')),
+                      pub_date=record['date'], updated=record['date'],
+                      image=record.get('image') or None)
+                 for record in records]
+        Post.objects.bulk_create(posts)
+        search.index_posts((post.pk, post.text) for post in posts)
+        # Подписчики авторов уже могут быть в базе: посты в их ленты.
+        for author_id in {post.author_id for post in posts} - {None}:
+            if not feed.is_celebrity(author_id):
+                feed.backfill_followers(author_id)
+        self.loaded['post'] += len(posts)
+
+    def load_comments(self, records):
+        """Комментарии к постам, которых нет в базе, пропускаются"""
+        for record in records:
+            record['date'] = parse_date(record.get('date'))
+        loaded = matching(
+            Comment, ('post_id', 'author__username', 'text', 'created'), {
+                int(record['id']): (int(record['post']), record['author'],
+                                    record['text'], record['date'])
+                for record in records})
+        posts = existing(Post, 'pk',
+                         {int(record['post']) for record in records})
+        records = [record for record in records
+                   if int(record['id']) not in loaded
+                   and int(record['post']) in posts]
+        authors = self.users.resolve(record['author'] for record in records)
+        Comment.objects.bulk_create(
+            [Comment(pk=int(record['id']), post_id=int(record['post']),
+                     author_id=authors[record['author']],
+                     text=record['text'], created=record['date'])
+             for record in records])
+        self.loaded['comment'] += len(records)
+
+    def load_follows(self, records):
+        users = self.users.resolve(
+            itertools.chain.from_iterable(
+                (record['user'], record['author']) for record in records))
+        pairs = {(users[record['user']], users[record['author']])
+                 for record in records
+                 if record['user'] != record['author']}
+        for batch in chunks({user_id for user_id, _ in pairs}, IN_CHUNK):
+            pairs -= set(Follow.objects.filter(user_id__in=batch)
+                         .values_list('user_id', 'author_id'))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs])
+        # Ленты новых подписчиков — запросом на автора, а не на пару.
+        followers = defaultdict(list)
+        for user_id, author_id in pairs:
+            followers[author_id].append(user_id)
+        for author_id, user_ids in followers.items():
+            for batch in chunks(user_ids, IN_CHUNK):
+                feed.backfill_followers(author_id, batch)
+        self.loaded['follow'] += len(pairs)
+
+    def reset_sequences(self):
+        """Явные id не двигают последовательности PostgreSQL"""
+        statements = connection.ops.sequence_reset_sql(no_style(),
+                                                       [Post, Comment])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
@@ -0,0 +1,125 @@
+"""
+Приём изображений постов с ограниченным расходом памяти.
+
+Тело запроса не накапливается в памяти: обработчик загрузки пишет файл
+во временный файл кусками и перестаёт писать, как только превышен
+IMAGE_UPLOAD_MAX_BYTES (размер при этом считается до конца, и форма
+показывает понятную ошибку). Размеры картинки читаются из заголовка,
+без декодирования пикселей, и сверяются с IMAGE_UPLOAD_MAX_PIXELS.
+
+Прошедшее проверку изображение перекодируется: поворот по EXIF
+применяется к пикселям, метаданные (EXIF, GPS, текстовые чанки)
+не сохраняются, длинная сторона уменьшается до IMAGE_MAX_SIDE. JPEG
+декодируется сразу в уменьшенном масштабе (draft), а одновременных
+декодирований не больше IMAGE_DECODE_CONCURRENCY, так что пиковая
+память процесса ограничена этим числом и лимитом пикселей.
+"""
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Форматы, которые сохраняются как есть; остальное перекодируется в PNG.
+KEEP_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+
+_decode_slots = None
+_decode_slots_lock = threading.Lock()
+
+
+def decode_slots():
+    global _decode_slots
+    with _decode_slots_lock:
+        if _decode_slots is None:
+            _decode_slots = threading.BoundedSemaphore(
+                settings.IMAGE_DECODE_CONCURRENCY)
+    return _decode_slots
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Пишет загрузку во временный файл, но не больше
+    IMAGE_UPLOAD_MAX_BYTES. Остаток запроса дочитывается и отбрасывается,
+    а у файла остаётся полный размер, чтобы форма могла его отклонить.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_BYTES:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+
+def validate_size(uploaded):
+    if uploaded.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s.', code='file_too_large',
+            params={'limit': filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES)})
+
+
+def validate_image(uploaded):
+    """Проверяет байты и пиксели по заголовку, не декодируя картинку"""
+    validate_size(uploaded)
+    # forms.ImageField уже открыл файл и положил заголовок в .image.
+    width, height = uploaded.image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение %(width)s×%(height)s слишком большое.',
+            code='too_many_pixels',
+            params={'width': width, 'height': height})
+
+
+def reencode(uploaded):
+    """
+    Возвращает новый файл: картинка повернута по EXIF, уменьшена до
+    IMAGE_MAX_SIDE и сохранена без метаданных. Крупный результат
+    уходит из памяти во временный файл.
+    """
+    max_side = settings.IMAGE_MAX_SIDE
+    if hasattr(uploaded, 'temporary_file_path'):
+        source = uploaded.temporary_file_path()
+    else:
+        uploaded.seek(0)
+        source = uploaded
+
+    with decode_slots(), Image.open(source) as image:
+        image_format = image.format if image.format in KEEP_FORMATS else 'PNG'
+        icc_profile = image.info.get('icc_profile')
+        # Для JPEG декодер сразу уменьшает картинку в 2, 4 или 8 раз,
+        # если результат не меньше итогового размера по обеим сторонам.
+        scale = min(1, max_side / max(image.size))
+        image.draft(image.mode, (round(image.width * scale),
+                                 round(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+
+        options = dict(SAVE_OPTIONS[image_format])
+        if icc_profile:
+            options['icc_profile'] = icc_profile
+        output = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        image.save(output, image_format, **options)
+
+    size = output.tell()
+    output.seek(0)
+    extension = KEEP_FORMATS[image_format]
+    name = f'{os.path.splitext(uploaded.name)[0]}.{extension}'
+    return UploadedFile(output, name, Image.MIME[image_format], size)
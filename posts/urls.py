@@ -9,6 +9,7 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('new', views.post_new, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
     path('group/<str:slug>/', views.group_posts, name='group'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
@@ -16,6 +17,8 @@ urlpatterns = [
          name='post_edit'),
     path("<str:username>/<int:post_id>/comment/", views.add_comment,
          name='add_comment'),
+    path('<str:username>/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('<str:username>/follow/', views.profile_follow,
          name='profile_follow'),
     path("<str:username>/unfollow/", views.profile_unfollow,
@@ -1,28 +1,94 @@
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404
+from django.db import router
 from .models import Post, Group, User, Follow
-from .forms import PostForm, CommentForm
+from .cache import Fragment
+from .conditional import public_page
+from .feed import follow_feed
+from .forms import PostForm, CommentForm, SearchForm
+from .paginator import CursorPaginator
+from .routers import read_replica
+from .search import SearchPaginator
+from . import thumbnails, writes
+from django.http import Http404
 from django.shortcuts import redirect
 from http import HTTPStatus
 
 
+def feed_scopes(request):
+    return ('posts', 'groups')
+
+
+def group_scopes(request, slug):
+    return (f'group:{get_object_or_404(Group, slug=slug).pk}', 'groups')
+
+
+def author_scopes(request, username, **kwargs):
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username)
+    return (f'author:{author_id}', f'profile:{author_id}', 'groups')
+
+
+def get_post(request, post_id):
+    """
+    Пост из URL вместе с автором, его профилем и группой — одним
+    запросом. Результат запоминается в request, чтобы проверка ETag и
+    представление не искали его дважды. Пост с реплики читается заново,
+    если проверка ETag переключила страницу на основную базу.
+    """
+    post = getattr(request, 'viewed_post', None)
+    if post is None or post._state.db != router.db_for_read(Post):
+        request.viewed_post = get_object_or_404(
+            Post.objects.for_feed().select_related('author__profile')
+            .filter(author__isnull=False), id=post_id)
+    return request.viewed_post
+
+
+def post_scopes(request, username, post_id):
+    author_id = get_post(request, post_id).author_id
+    return (f'author:{author_id}', f'profile:{author_id}', 'groups')
+
+
+@read_replica
+@public_page(feed_scopes)
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    return render(request, 'index.html', {'page': page})
+    latest = Post.objects.for_feed()
+    paginator = CursorPaginator(latest, 10)
+    page = paginator.page_from_request(request)
+    fragment = Fragment.for_request(request, 'index', scopes=('posts',))
+    return render(request, 'index.html',
+                  {'page': page, 'fragment': fragment})
 
 
+@read_replica
+@public_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.for_feed()
+    paginator = CursorPaginator(posts, 10)
+    page = paginator.page_from_request(request)
+    fragment = Fragment.for_request(request, 'group', group.pk,
+                                    scopes=(f'group:{group.pk}',))
     return render(request, 'group.html',
-                  {'group': group, 'posts': posts, 'page': page})
+                  {'group': group, 'posts': posts, 'page': page,
+                   'fragment': fragment})
+
+
+@read_replica
+def search(request):
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        paginator = SearchPaginator(form.cleaned_data['q'], 10,
+                                    group=form.cleaned_data['group'],
+                                    author=form.cleaned_data['author'])
+        page = paginator.page_from_request(request)
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    return render(request, 'search.html',
+                  {'form': form, 'page': page,
+                   'cursor_params': params.urlencode()})
 
 
 @login_required
@@ -31,57 +97,72 @@ def post_new(request):
         form = PostForm()
         return render(request, 'newpost.html', {'form': form})
 
-    form = PostForm(request.POST)
+    form = PostForm(request.POST, files=request.FILES or None)
 
     if not form.is_valid():
         return render(request, 'newpost.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    writes.save_post(post)
+    thumbnails.schedule(post)
     return redirect('index')
 
 
+@read_replica
+@public_page(author_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    all_posts = Post.objects.all().filter(author__username=username)
-    counter = all_posts.count()
+    author = get_object_or_404(User.objects.select_related('profile'),
+                               username=username)
+    all_posts = Post.objects.for_feed().filter(author=author)
     following = author.following.all()
-    follower = author.follower.all()
-    count_follower = follower.count()
-    count_following = following.count()
-    paginator = Paginator(all_posts, 5)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    paginator = CursorPaginator(all_posts, 5)
+    page = paginator.page_from_request(request)
+    fragment = Fragment.for_request(request, 'profile', author.pk,
+                                    scopes=(f'author:{author.pk}',))
     return render(request, 'profile.html',
                   {'page': page,
+                   'fragment': fragment,
                    'author': author,
-                   'counter': counter,
-                   'count_following': count_following,
-                   'count_follower': count_follower,
+                   'counter': author.profile.post_count,
+                   'count_following': author.profile.follower_count,
+                   'count_follower': author.profile.following_count,
                    'following': following})
 
 
+def comment_context(request, post):
+    """Порция комментариев после ?cursor= и курсор следующей"""
+    paginator = post.comment_paginator()
+    comments = paginator.forward_queryset(request.GET.get('cursor'))
+    return {'post': post,
+            'comments': comments,
+            'comments_next': paginator.next_cursor_after(comments)}
+
+
+@read_replica
+@public_page(post_scopes)
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    full_post = get_object_or_404(Post, id=post_id)
-    post = get_object_or_404(Post, id=post_id)
-    all_posts = Post.objects.all().filter(author__username=username)
-    following = author.following.all()
-    follower = author.follower.all()
-    count_follower = follower.count()
-    count_following = following.count()
-    counter = all_posts.count()
-    form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    post = get_post(request, post_id)
+    author = post.author
+    if author.username != username:
+        return redirect('post', username=author.username, post_id=post.id)
     return render(request, 'post.html',
                   {'author': author,
-                   'counter': counter,
-                   'form': form,
-                   'comments': comments,
-                   'post': post,
-                   'full_post': full_post,
-                   'count_follower': count_follower,
-                   'count_following': count_following})
+                   'counter': author.profile.post_count,
+                   'form': CommentForm(),
+                   'count_follower': author.profile.following_count,
+                   'count_following': author.profile.follower_count,
+                   **comment_context(request, post)})
+
+
+@read_replica
+@public_page(post_scopes)
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев HTML-фрагментом для «Показать ещё»"""
+    post = get_post(request, post_id)
+    if post.author.username != username:
+        raise Http404('Пост другого автора')
+    return render(request, 'include/comment_list.html',
+                  comment_context(request, post))
 
 
 @login_required
@@ -94,7 +175,7 @@ def add_comment(request, username, post_id):
     comment = form.save(commit=False)
     comment.post = post
     comment.author = request.user
-    comment.save()
+    writes.save_comment(comment)
     return redirect('post', username=post.author, post_id=post.id)
 
 
@@ -109,6 +190,8 @@ def post_edit(request, username, post_id):
         return redirect('post', username=post.author, post_id=post.id)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('post', username=post.author, post_id=post.id)
     return render(request, 'newpost.html',
                   {'form': form, 'post': post, 'author': author})
@@ -127,15 +210,21 @@ def server_error(request):
     return render(request, 'misc/500.html', status=500)
 
 
+@read_replica
 @login_required
 def follow_index(request):
-    post_list_follow = Post.objects.filter(
-        author__following__user=request.user)
+    post_list_follow = follow_feed(request.user)
+    # Контракт страницы /follow/ требует в контексте ровно Paginator/Page,
+    # поэтому здесь остаётся нумерованная пагинация.
     paginator = Paginator(post_list_follow, 10)
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
+    fragment = Fragment.for_request(
+        request, 'follow', scopes=('posts', f'follow:{request.user.pk}'),
+        per_user=True)
     return render(request, 'follow.html',
-                  {'page': page, 'paginator': paginator})
+                  {'page': page, 'paginator': paginator,
+                   'fragment': fragment})
 
 
 @login_required
@@ -0,0 +1,26 @@
+from django.db import models
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    """
+    Денормализованные счётчики пользователя. Обновляются сигналами
+    из posts/signals.py, пересчитываются командой repair_counters.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name='profile',
+                                verbose_name='Пользователь')
+    post_count = models.PositiveIntegerField(default=0,
+                                             verbose_name='Записей')
+    follower_count = models.PositiveIntegerField(default=0,
+                                                 verbose_name='Подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='Подписан')
+
+    class Meta:
+        verbose_name_plural = 'Профили пользователей'
+
+    def __str__(self):
+        return str(self.user)
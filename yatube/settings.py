@@ -34,11 +34,36 @@ ALLOWED_HOSTS = [
 
 
 # Application definition
+# Кэш выбирается переменной окружения CACHE_BACKEND. По умолчанию
+# файловый: он общий для всех воркеров gunicorn, в отличие от locmem.
+# memcached требует python-memcached, redis — django-redis.
+CACHE_BACKENDS = {
+    'file': ('django.core.cache.backends.filebased.FileBasedCache',
+             os.path.join(BASE_DIR, 'cache')),
+    'memcached': ('django.core.cache.backends.memcached.MemcachedCache',
+                  '127.0.0.1:11211'),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND][0],
+        'LOCATION': os.environ.get('CACHE_LOCATION',
+                                   CACHE_BACKENDS[CACHE_BACKEND][1]),
+        'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'yatube'),
+    }
+}
+# Тесты (manage.py test — TEST_RUNNER, pytest — posts/pytest_plugin.py)
+# работают с TEST_CACHES: locmem, чтобы не писать в каталог cache/
+# проекта, или кэш из CACHE_BACKEND, если он задан явно.
+TEST_CACHES = CACHES if 'CACHE_BACKEND' in os.environ else {
+    'default': {
+        'BACKEND': CACHE_BACKENDS['locmem'][0],
+        'KEY_PREFIX': CACHES['default']['KEY_PREFIX'],
     }
 }
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
 
 INSTALLED_APPS = [
     'about',
@@ -54,13 +79,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.middleware.MetricsMiddleware',
+    'posts.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.SharedCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.middleware.PrimaryStickyMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -69,7 +98,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 ABOUT_TEMPLATES = os.path.join(BASE_DIR, "about/templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, который учитывает время рендера в метриках.
+        'BACKEND': 'posts.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR, ABOUT_TEMPLATES],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,9 +124,33 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, PRAGMA не повторяются.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
     }
 }
 
+# Реплика для чтения лент (posts/routers.py): копия основной базы,
+# которую поддерживает внешняя репликация (Litestream, LiteFS и т. п.).
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {**DATABASES['default'],
+                            'NAME': os.environ['DB_REPLICA_NAME']}
+DATABASE_ROUTERS = ['posts.routers.PrimaryReplicaRouter']
+# Максимальное отставание реплики, с: столько после записи браузер
+# читает с основной базы, и столько же после изменения области кэша.
+REPLICA_MAX_LAG = 5
+
+# PRAGMA каждого нового соединения SQLite (posts/sqlite.py).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в КиБ: 64 МБ кэша страниц.
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+    # Мс ожидания чужой блокировки записи до «database is locked».
+    'busy_timeout': 5000,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -151,11 +205,77 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки пишутся во временный файл сразу, а не в память, и обрезаются
+# на IMAGE_UPLOAD_MAX_BYTES (posts/uploads.py).
+FILE_UPLOAD_HANDLERS = ['posts.uploads.LimitedTemporaryFileUploadHandler']
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+# Сохранённый оригинал не больше IMAGE_MAX_SIDE по длинной стороне.
+IMAGE_MAX_SIDE = 2560
+IMAGE_DECODE_CONCURRENCY = 2
+
+# Миниатюры карточек строятся в пуле потоков после сохранения поста.
+# THUMBNAIL_BACKGROUND = False строит их сразу, в том же запросе.
+THUMBNAIL_BACKGROUND = True
+THUMBNAIL_WORKERS = 2
+# Ширины вариантов карточки для srcset (полная ширина карточки — 960).
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+
 # Login
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
 LOGOUT_REDIRECT_URL = "index"
 
+# Follow feed
+# Авторы с числом подписчиков больше FEED_FANOUT_LIMIT не раскладывают
+# посты по лентам при публикации, их посты подмешиваются при чтении.
+# При подписке в ленту переносятся FEED_BACKFILL_SIZE последних постов.
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_SIZE = 200
+# Фрагменты лент сбрасываются по версиям (posts/cache.py), поэтому
+# срок жизни большой.
+FEED_CACHE_TIMEOUT = 60 * 60
+# Комментариев на странице поста и в одной подгружаемой порции.
+COMMENTS_PAGE_SIZE = 50
+
+# Admin
+# Списки админки без фильтров берут число строк из статистики БД,
+# если таблица больше порога (posts.paginator.EstimatedCountPaginator).
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Запись под нагрузкой (posts/writes.py)
+# Ведущий запрос ждёт WRITE_BATCH_LINGER секунд, собирая комментарии
+# параллельных запросов в одну пачку не больше WRITE_BATCH_SIZE.
+WRITE_BATCH_LINGER = 0.005
+WRITE_BATCH_SIZE = 100
+# Повторы транзакции при «database is locked»: задержка удваивается.
+WRITE_RETRIES = 5
+WRITE_RETRY_BACKOFF = 0.02
+
+# Метрики запросов (posts/metrics.py): доля замеряемых запросов,
+# 0 — выключено. /metrics отвечает только с заголовком
+# Authorization: Bearer <METRICS_TOKEN>; без токена — 404 всем.
+METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Поиск N+1 запросов (posts/nplusone.py): 'log' — предупреждение в лог,
+# 'raise' — ошибка, пусто — выключено. Порог — число одинаковых
+# запросов из одного места.
+NPLUSONE_DETECT = os.environ.get('NPLUSONE_DETECT', '')
+NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 3))
+
+# Conditional GET
+# RELEASE входит в ETag страниц и API, чтобы после выкладки новых
+# шаблонов клиенты не получили 304 на старую разметку.
+RELEASE = os.environ.get('RELEASE', '')
+# Сколько секунд общий кэш может отдавать анонимную страницу без
+# перепроверки; 0 — перепроверять по ETag каждый раз.
+PUBLIC_PAGE_SHARED_MAX_AGE = 0
+
+# Search
+# Конфигурация полнотекстового поиска PostgreSQL (posts/search.py).
+SEARCH_CONFIG = 'russian'
+
 # Email
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
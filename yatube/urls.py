@@ -19,6 +19,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.conf.urls import handler404, handler500
 
+from posts.metrics import prometheus
+
 
 handler404 = "posts.views.page_not_found"  # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -26,6 +28,8 @@ handler500 = "posts.views.server_error"  # noqa
 
 urlpatterns = [
     path('administrator/', admin.site.urls),
+    path('api/v1/', include('posts.api_urls', namespace='api')),
+    path('metrics', prometheus, name='metrics'),
     path("", include("posts.urls")),
     path("about/", include("about.urls", namespace="about")),
     path("auth/", include("users.urls")),